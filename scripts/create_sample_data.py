@@ -36,7 +36,7 @@ class AiAnalysisEngine:
         # 任務佇列
         self.task_queue = TaskQueue(self.config.limits.max_concurrent_analyses)
         
-        self.logger.log_analysis("info", "引擎初始化完成", config=self.config.dict())
+        self.logger.log_analysis("info", "引擎初始化完成", config=self.config.model_dump(exclude_unset=True, mode="json"))
     
     def _init_wrappers(self):
         """初始化所有 wrapper"""
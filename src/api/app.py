@@ -675,7 +675,7 @@ def estimate_cost():
 
 def calculate_api_queries(file_size_kb, model, calculator):
     """計算需要的 API 查詢次數"""
-    model_info = calculator._model_info_cache.get(model)
+    model_info = calculator.model_costs.get(model)
     if not model_info:
         return 1
     
@@ -220,7 +220,7 @@ def get_model_prices():
         # 獲取所有模型資訊
         all_models = []
         
-        for model_name, model_info in cost_calculator._model_info_cache.items():
+        for model_name, model_info in cost_calculator.model_costs.items():
             all_models.append({
                 'provider': model_info.provider,
                 'model': model_info.model,
@@ -281,8 +281,8 @@ def get_tier_models(tier: int):
         # 獲取每個模型的詳細資訊
         model_details = []
         for model_name in models:
-            if model_name in cost_calculator._model_info_cache:
-                info = cost_calculator._model_info_cache[model_name]
+            if model_name in cost_calculator.model_costs:
+                info = cost_calculator.model_costs[model_name]
                 model_details.append({
                     'model': model_name,
                     'provider': info.provider,
@@ -4,50 +4,53 @@ Anthropic API 配置
 from typing import Dict
 from .base import BaseApiConfig, ModelConfig, AnalysisMode
 
+# Anthropic 模型配置 - 修正價格單位（每 1k tokens）
+_MODELS: Dict[str, ModelConfig] = {
+    # Claude 3.5 系列
+    "claude-3-5-haiku-20241022": ModelConfig(
+        name="claude-3-5-haiku-20241022",
+        max_tokens=8192,
+        input_cost_per_1k=0.00025,   # $0.25 per million = $0.00025 per 1k
+        output_cost_per_1k=0.00125,  # $1.25 per million = $0.00125 per 1k
+        context_window=200000,
+        supports_streaming=True
+    ),
+    "claude-3-5-sonnet-20241022": ModelConfig(
+        name="claude-3-5-sonnet-20241022",
+        max_tokens=8192,
+        input_cost_per_1k=0.003,     # $3 per million = $0.003 per 1k
+        output_cost_per_1k=0.015,    # $15 per million = $0.015 per 1k
+        context_window=200000,
+        supports_streaming=True
+    ),
+    
+    # Claude 4 系列 (假設的價格，實際請參考官方)
+    "claude-sonnet-4-20250514": ModelConfig(
+        name="claude-sonnet-4-20250514",
+        max_tokens=16000,
+        input_cost_per_1k=0.005,     # $5 per million = $0.005 per 1k
+        output_cost_per_1k=0.025,    # $25 per million = $0.025 per 1k
+        context_window=200000,
+        supports_streaming=True
+    ),
+    "claude-opus-4-20250514": ModelConfig(
+        name="claude-opus-4-20250514",
+        max_tokens=32000,
+        input_cost_per_1k=0.015,     # $15 per million = $0.015 per 1k
+        output_cost_per_1k=0.075,    # $75 per million = $0.075 per 1k
+        context_window=200000,
+        supports_streaming=True
+    )
+}
+
 class AnthropicApiConfig(BaseApiConfig):
     """Anthropic API 配置"""
     
     base_url: str = "https://api.anthropic.com"
     api_version: str = "2023-06-01"
     
-    # Anthropic 模型配置 - 修正價格單位（每 1k tokens）
-    models: Dict[str, ModelConfig] = {
-        # Claude 3.5 系列
-        "claude-3-5-haiku-20241022": ModelConfig(
-            name="claude-3-5-haiku-20241022",
-            max_tokens=8192,
-            input_cost_per_1k=0.00025,   # $0.25 per million = $0.00025 per 1k
-            output_cost_per_1k=0.00125,  # $1.25 per million = $0.00125 per 1k
-            context_window=200000,
-            supports_streaming=True
-        ),
-        "claude-3-5-sonnet-20241022": ModelConfig(
-            name="claude-3-5-sonnet-20241022",
-            max_tokens=8192,
-            input_cost_per_1k=0.003,     # $3 per million = $0.003 per 1k
-            output_cost_per_1k=0.015,    # $15 per million = $0.015 per 1k
-            context_window=200000,
-            supports_streaming=True
-        ),
-        
-        # Claude 4 系列 (假設的價格，實際請參考官方)
-        "claude-sonnet-4-20250514": ModelConfig(
-            name="claude-sonnet-4-20250514",
-            max_tokens=16000,
-            input_cost_per_1k=0.005,     # $5 per million = $0.005 per 1k
-            output_cost_per_1k=0.025,    # $25 per million = $0.025 per 1k
-            context_window=200000,
-            supports_streaming=True
-        ),
-        "claude-opus-4-20250514": ModelConfig(
-            name="claude-opus-4-20250514",
-            max_tokens=32000,
-            input_cost_per_1k=0.015,     # $15 per million = $0.015 per 1k
-            output_cost_per_1k=0.075,    # $75 per million = $0.075 per 1k
-            context_window=200000,
-            supports_streaming=True
-        )
-    }
+    # 模型配置（預設為內建模型）
+    models: Dict[str, ModelConfig] = _MODELS
     
     default_model: str = "claude-sonnet-4-20250514"
     
@@ -1,9 +1,10 @@
 """
 基礎配置類別
 """
+import logging
 from abc import ABC, abstractmethod
-from typing import Dict, Optional, Any, List
-from pydantic import BaseModel, Field
+from typing import Dict, Optional, Any, List, Sequence, Tuple
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
 from enum import Enum
 from ..utils.logger import get_logger
 logger = get_logger(__name__)
@@ -48,6 +49,23 @@ class BaseApiConfig(BaseModel, ABC):
     models: Dict[str, ModelConfig] = Field(default_factory=dict)
     default_model: Optional[str] = None
     
+    # 各模型每個 token 的單價 (input, output)，依 models 預先計算
+    _pricing: Dict[str, Tuple[float, float]] = PrivateAttr(default_factory=dict)
+    
+    @model_validator(mode='after')
+    def _build_pricing(self) -> 'BaseApiConfig':
+        """
+        依目前的 models 建立每個 token 的單價表
+        
+        建立配置及指定欄位時（validate_assignment）都會重建；
+        直接修改 models 字典內容不會觸發，需重新指定 models。
+        """
+        self._pricing = {
+            name: (config.input_cost_per_1k / 1000, config.output_cost_per_1k / 1000)
+            for name, config in self.models.items()
+        }
+        return self
+    
     @abstractmethod
     def get_model_for_mode(self, mode: AnalysisMode) -> str:
         """根據分析模式獲取模型名稱"""
@@ -92,27 +110,37 @@ class BaseApiConfig(BaseModel, ABC):
         Returns:
             總成本（美元）
         """
-        if model_name not in self.models:
-            raise ValueError(f"Unknown model: {model_name}")
-        
-        model_config = self.models[model_name]
-        
-        # 確保價格是每 1000 tokens
-        input_cost = (input_tokens / 1000.0) * model_config.input_cost_per_1k
-        output_cost = (output_tokens / 1000.0) * model_config.output_cost_per_1k
+        input_price, output_price = self._token_prices(model_name)
+        total_cost = input_tokens * input_price + output_tokens * output_price
         
-        total_cost = input_cost + output_cost
-        
-        # 添加調試日誌
-        logger.debug(
-            f"Cost calculation for {model_name}: "
-            f"input_tokens={input_tokens} ({input_tokens/1000:.2f}k) × ${model_config.input_cost_per_1k}/1k = ${input_cost:.4f}, "
-            f"output_tokens={output_tokens} ({output_tokens/1000:.2f}k) × ${model_config.output_cost_per_1k}/1k = ${output_cost:.4f}, "
-            f"total=${total_cost:.4f}"
-        )
+        # 添加調試日誌（只在啟用 DEBUG 時組字串）
+        if logger.logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"Cost calculation for {model_name}: "
+                f"input_tokens={input_tokens} × ${input_price * 1000}/1k = ${input_tokens * input_price:.4f}, "
+                f"output_tokens={output_tokens} × ${output_price * 1000}/1k = ${output_tokens * output_price:.4f}, "
+                f"total=${total_cost:.4f}"
+            )
         
         return total_cost
     
+    def calculate_cost_batch(self, input_tokens: Sequence[int], output_tokens: Sequence[int],
+                             model_name: str) -> List[float]:
+        """
+        批次計算多次 API 調用的成本（例如串流中的各個 chunk）
+        
+        單價只查詢一次，逐筆結果與 calculate_cost 相同。
+        """
+        input_price, output_price = self._token_prices(model_name)
+        return [i * input_price + o * output_price for i, o in zip(input_tokens, output_tokens)]
+    
+    def _token_prices(self, model_name: str) -> Tuple[float, float]:
+        """從預先計算的單價表取得每個 token 的單價 (input, output)"""
+        prices = self._pricing.get(model_name)
+        if prices is None:
+            raise ValueError(f"Unknown model: {model_name}")
+        return prices
+    
     def validate_token_limit(self, tokens: int, model_name: str) -> bool:
         """驗證 token 限制"""
         config = self.get_model_config(model_name)
@@ -4,56 +4,59 @@ OpenAI API 配置
 from typing import Dict
 from .base import BaseApiConfig, ModelConfig, AnalysisMode
 
+# OpenAI 模型配置 - 修正價格單位（每 1k tokens）
+_MODELS: Dict[str, ModelConfig] = {
+    # GPT-4o 系列
+    "gpt-4o-mini": ModelConfig(
+        name="gpt-4o-mini",
+        max_tokens=16384,
+        input_cost_per_1k=0.00015,   # $0.15 per million = $0.00015 per 1k
+        output_cost_per_1k=0.0006,   # $0.60 per million = $0.0006 per 1k
+        context_window=128000,
+        supports_streaming=True,
+        supports_function_calling=True
+    ),
+    "gpt-4o": ModelConfig(
+        name="gpt-4o",
+        max_tokens=16384,
+        input_cost_per_1k=0.0025,    # $2.50 per million = $0.0025 per 1k
+        output_cost_per_1k=0.01,     # $10 per million = $0.01 per 1k
+        context_window=128000,
+        supports_streaming=True,
+        supports_function_calling=True
+    ),
+    
+    # GPT-4 Turbo
+    "gpt-4-turbo": ModelConfig(
+        name="gpt-4-turbo",
+        max_tokens=4096,
+        input_cost_per_1k=0.01,      # $10 per million = $0.01 per 1k
+        output_cost_per_1k=0.03,     # $30 per million = $0.03 per 1k
+        context_window=128000,
+        supports_streaming=True,
+        supports_function_calling=True
+    ),
+    
+    # GPT-3.5 Turbo
+    "gpt-3.5-turbo": ModelConfig(
+        name="gpt-3.5-turbo",
+        max_tokens=4096,
+        input_cost_per_1k=0.0005,    # $0.50 per million = $0.0005 per 1k
+        output_cost_per_1k=0.0015,   # $1.50 per million = $0.0015 per 1k
+        context_window=16385,
+        supports_streaming=True,
+        supports_function_calling=True
+    )
+}
+
 class OpenApiConfig(BaseApiConfig):
     """OpenAI API 配置"""
     
     base_url: str = "https://api.openai.com/v1"
     organization: str = None
     
-    # OpenAI 模型配置 - 修正價格單位（每 1k tokens）
-    models: Dict[str, ModelConfig] = {
-        # GPT-4o 系列
-        "gpt-4o-mini": ModelConfig(
-            name="gpt-4o-mini",
-            max_tokens=16384,
-            input_cost_per_1k=0.00015,   # $0.15 per million = $0.00015 per 1k
-            output_cost_per_1k=0.0006,   # $0.60 per million = $0.0006 per 1k
-            context_window=128000,
-            supports_streaming=True,
-            supports_function_calling=True
-        ),
-        "gpt-4o": ModelConfig(
-            name="gpt-4o",
-            max_tokens=16384,
-            input_cost_per_1k=0.0025,    # $2.50 per million = $0.0025 per 1k
-            output_cost_per_1k=0.01,     # $10 per million = $0.01 per 1k
-            context_window=128000,
-            supports_streaming=True,
-            supports_function_calling=True
-        ),
-        
-        # GPT-4 Turbo
-        "gpt-4-turbo": ModelConfig(
-            name="gpt-4-turbo",
-            max_tokens=4096,
-            input_cost_per_1k=0.01,      # $10 per million = $0.01 per 1k
-            output_cost_per_1k=0.03,     # $30 per million = $0.03 per 1k
-            context_window=128000,
-            supports_streaming=True,
-            supports_function_calling=True
-        ),
-        
-        # GPT-3.5 Turbo
-        "gpt-3.5-turbo": ModelConfig(
-            name="gpt-3.5-turbo",
-            max_tokens=4096,
-            input_cost_per_1k=0.0005,    # $0.50 per million = $0.0005 per 1k
-            output_cost_per_1k=0.0015,   # $1.50 per million = $0.0015 per 1k
-            context_window=16385,
-            supports_streaming=True,
-            supports_function_calling=True
-        )
-    }
+    # 模型配置（預設為內建模型）
+    models: Dict[str, ModelConfig] = _MODELS
     
     default_model: str = "gpt-4o"
     
@@ -2,21 +2,48 @@
 系統配置
 """
 import os
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Mapping, Tuple
 from pathlib import Path
 import yaml
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from pydantic import BaseModel, Field, ValidationInfo, field_validator, model_validator, ConfigDict, PrivateAttr
 from dotenv import load_dotenv
 
 from .base import (
     SystemLimits, CacheConfig, LoggingConfig, 
     DatabaseConfig, RateLimitConfig, ModelPreferences, 
-    MonitoringConfig
+    MonitoringConfig, AnalysisMode
 )
+from .anthropic_config import AnthropicApiConfig
+from .openai_config import OpenApiConfig
+
+# 優先使用 LibYAML 的 C 實作
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
 
 # 載入環境變數
 load_dotenv()
 
+# 分析模式對應 _mode_table 的索引，同時接受 Enum 與其字串值
+_MODE_INDEX: Dict[Any, int] = {}
+for _index, _mode in enumerate(AnalysisMode):
+    _MODE_INDEX[_mode] = _MODE_INDEX[_mode.value] = _index
+
+# 驗證 context 中存放環境變數快照的鍵值
+_ENV_CONTEXT_KEY = 'env'
+
+def _context_env(info: ValidationInfo) -> Mapping[str, str]:
+    """
+    取得本次建立配置時的環境變數快照
+    
+    由 SystemConfig 建立時經驗證 context 傳入；單獨建立子模型時直接讀取 os.environ。
+    """
+    context = info.context
+    if context and _ENV_CONTEXT_KEY in context:
+        return context[_ENV_CONTEXT_KEY]
+    return os.environ
+
 class ApiKeys(BaseModel):
     """API 金鑰配置"""
     anthropic: Optional[str] = Field(None, description="Anthropic API Key")
@@ -27,7 +54,7 @@ class ApiKeys(BaseModel):
         """從環境變數載入 API Key"""
         if v is None:
             env_key = f"{info.field_name.upper()}_API_KEY"
-            v = os.getenv(env_key)
+            v = _context_env(info).get(env_key)
         return v
 
 class SystemInfo(BaseModel):
@@ -37,9 +64,9 @@ class SystemInfo(BaseModel):
     environment: str = Field("development", description="development, staging, production")
     
     @field_validator('environment', mode='before')
-    def load_environment(cls, v):
+    def load_environment(cls, v, info: ValidationInfo):
         """從環境變數載入環境設定"""
-        return os.getenv('ENVIRONMENT', v)
+        return _context_env(info).get('ENVIRONMENT', v)
 
 class SystemConfig(BaseModel):
     """完整系統配置"""
@@ -59,6 +86,53 @@ class SystemConfig(BaseModel):
     model_preferences: ModelPreferences = Field(default_factory=ModelPreferences)
     monitoring: MonitoringConfig = Field(default_factory=MonitoringConfig)
     
+    # 依 AnalysisMode 順序排列的 (anthropic 模型, openai 模型)
+    _mode_table: Tuple[Tuple[str, str], ...] = PrivateAttr(default=())
+    
+    def __init__(self, **data: Any):
+        """建立配置；整個建立過程共用一份環境變數快照，建立完成後即丟棄"""
+        self._validate_with_env(data, dict(os.environ))
+    
+    def _validate_with_env(self, data: Dict[str, Any], env: Mapping[str, str]) -> None:
+        """以指定的環境變數快照驗證並填入配置"""
+        self.__pydantic_validator__.validate_python(
+            data, self_instance=self, context={_ENV_CONTEXT_KEY: env}
+        )
+    
+    @model_validator(mode='after')
+    def _build_mode_table(self) -> 'SystemConfig':
+        """
+        合併 mode_overrides 與各提供者的預設模型
+        
+        建立配置及指定欄位時（validate_assignment）都會重建；
+        直接修改 mode_overrides 字典內容不會觸發，需重新指定 model_preferences。
+        """
+        anthropic_defaults = AnthropicApiConfig.model_fields['mode_model_mapping'].default
+        openai_defaults = OpenApiConfig.model_fields['mode_model_mapping'].default
+        overrides = self.model_preferences.mode_overrides
+        
+        table = []
+        for mode in AnalysisMode:
+            override = overrides.get(mode.value, {})
+            table.append((
+                override.get('anthropic', anthropic_defaults[mode]),
+                override.get('openai', openai_defaults[mode])
+            ))
+        self._mode_table = tuple(table)
+        return self
+    
+    def get_models_for_mode(self, mode) -> Tuple[str, str]:
+        """
+        獲取分析模式對應的模型
+        
+        Args:
+            mode: AnalysisMode 或其字串值
+            
+        Returns:
+            (anthropic 模型, openai 模型)
+        """
+        return self._mode_table[_MODE_INDEX[mode]]
+    
     @classmethod
     def from_yaml(cls, config_path: str) -> 'SystemConfig':
         """從 YAML 檔案載入配置"""
@@ -68,12 +142,16 @@ class SystemConfig(BaseModel):
             return cls()
         
         with open(path, 'r', encoding='utf-8') as f:
-            config_data = yaml.safe_load(f) or {}
+            config_data = yaml.load(f, Loader=YamlLoader) or {}
         
-        # 合併環境變數
-        config_data = cls._merge_env_vars(config_data)
+        # 合併環境變數，合併與驗證共用同一份快照
+        env = dict(os.environ)
+        config_data = cls._merge_env_vars(config_data, env)
         
-        return cls(**config_data)
+        # 自訂 __init__ 會自行取快照，因此直接以同一份快照驗證
+        config = cls.__new__(cls)
+        config._validate_with_env(config_data, env)
+        return config
     
     @classmethod
     def from_env(cls) -> 'SystemConfig':
@@ -81,28 +159,34 @@ class SystemConfig(BaseModel):
         return cls()
     
     @staticmethod
-    def _merge_env_vars(config_data: Dict[str, Any]) -> Dict[str, Any]:
-        """合併環境變數到配置"""
+    def _merge_env_vars(config_data: Dict[str, Any],
+                        env: Optional[Mapping[str, str]] = None) -> Dict[str, Any]:
+        """合併環境變數到配置（env 為環境變數快照，預設讀取 os.environ）"""
+        if env is None:
+            env = os.environ
+        
         # API Keys
         if 'api_keys' not in config_data:
             config_data['api_keys'] = {}
         
         for key in ['anthropic', 'openai']:
-            env_key = f"{key.upper()}_API_KEY"
-            if os.getenv(env_key):
-                config_data['api_keys'][key] = os.getenv(env_key)
+            api_key = env.get(f"{key.upper()}_API_KEY")
+            if api_key:
+                config_data['api_keys'][key] = api_key
         
         # Database URL
-        if os.getenv('DATABASE_URL'):
+        database_url = env.get('DATABASE_URL')
+        if database_url:
             if 'database' not in config_data:
                 config_data['database'] = {}
-            config_data['database']['url'] = os.getenv('DATABASE_URL')
+            config_data['database']['url'] = database_url
         
         # Environment
-        if os.getenv('ENVIRONMENT'):
+        environment = env.get('ENVIRONMENT')
+        if environment:
             if 'system' not in config_data:
                 config_data['system'] = {}
-            config_data['system']['environment'] = os.getenv('ENVIRONMENT')
+            config_data['system']['environment'] = environment
         
         return config_data
     
@@ -117,7 +201,7 @@ class SystemConfig(BaseModel):
                     config_dict['api_keys'][key] = f"${{{key.upper()}_API_KEY}}"
         
         with open(output_path, 'w', encoding='utf-8') as f:
-            yaml.dump(config_dict, f, default_flow_style=False, sort_keys=False)
+            yaml.dump(config_dict, f, Dumper=YamlDumper, default_flow_style=False, sort_keys=False)
     
     def validate_config(self) -> tuple[bool, list[str]]:
         """驗證配置是否完整"""
@@ -2,7 +2,9 @@
 取消機制實作
 """
 import asyncio
-from typing import Dict, Optional, Callable
+import heapq
+import time
+from typing import Awaitable, Dict, List, Optional, Set, Tuple, Callable
 from datetime import datetime
 from enum import Enum
 import uuid
@@ -18,52 +20,189 @@ class CancellationReason(Enum):
     ERROR = "error"
     SYSTEM_SHUTDOWN = "system_shutdown"
 
+_NS_PER_SECOND = 1_000_000_000
+
+class _CompletedAwaitable:
+    """已完成的可等待物件，await 時立即返回 None，不建立協程"""
+    __slots__ = ()
+    
+    def __await__(self):
+        return iter(())
+
+_COMPLETED = _CompletedAwaitable()
+
+def monotonic_ns_to_datetime(timestamp_ns: int) -> datetime:
+    """將 time.monotonic_ns() 時間戳換算為本地時間"""
+    age_seconds = (time.monotonic_ns() - timestamp_ns) / _NS_PER_SECOND
+    return datetime.fromtimestamp(time.time() - age_seconds)
+
 class CancellationToken:
     """取消令牌"""
-    def __init__(self, analysis_id: str):
+    __slots__ = (
+        'analysis_id', 'is_cancelled', 'reason', 'created_at', 'cancelled_at',
+        '_sync_callbacks', '_async_callbacks', '_pending_callbacks', '_lock',
+        '_loop', '_loop_thread_id', '_cancelled_future'
+    )
+    
+    def __init__(self, analysis_id: str, loop: Optional[asyncio.AbstractEventLoop] = None):
         self.analysis_id = analysis_id
         self.is_cancelled = False
         self.reason: Optional[CancellationReason] = None
-        self.cancelled_at: Optional[datetime] = None
-        self._callbacks: list[Callable] = []
+        # 時間戳使用 time.monotonic_ns()，不受系統時鐘調整影響
+        self.created_at = time.monotonic_ns()
+        self.cancelled_at: Optional[int] = None
+        # 同步與非同步回調在註冊時即分開存放，取消時不需逐一判斷
+        self._sync_callbacks: list[Callable] = []
+        self._async_callbacks: list[Callable] = []
+        self._pending_callbacks: list[asyncio.Future] = []
         self._lock = threading.Lock()  # 使用線程鎖而不是異步鎖
+        # 由管理器傳入的事件循環，排程非同步回調時不必再查詢
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident() if loop is not None else None
+        # wait_cancelled() 首次呼叫時才建立
+        self._cancelled_future: Optional[asyncio.Future] = None
     
     def cancel(self, reason: CancellationReason = CancellationReason.USER_CANCELLED):
         """取消操作"""
         with self._lock:
-            if not self.is_cancelled:
-                self.is_cancelled = True
-                self.reason = reason
-                self.cancelled_at = datetime.now()
-                
-                # 執行所有回調
-                for callback in self._callbacks:
-                    try:
-                        callback()
-                    except Exception:
-                        pass
+            if self.is_cancelled:
+                return
+            self.is_cancelled = True
+            self.reason = reason
+            self.cancelled_at = time.monotonic_ns()
+            sync_callbacks = tuple(self._sync_callbacks)
+            async_callbacks = tuple(self._async_callbacks)
+            cancelled_future = self._cancelled_future
+        
+        if cancelled_future is not None:
+            self._resolve_cancelled_future(cancelled_future)
+        
+        # 在鎖外執行所有回調
+        for callback in sync_callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+        
+        if async_callbacks:
+            self._schedule_async_callbacks(async_callbacks)
+    
+    def wait_cancelled(self) -> asyncio.Future:
+        """
+        獲取取消時完成的 Future，可與其他工作一起交給 asyncio.wait
+        
+        同一令牌的所有等待者共用此 Future，請勿將其取消。
+        """
+        with self._lock:
+            future = self._cancelled_future
+            if future is None or future.get_loop().is_closed():
+                loop = self._loop
+                if loop is None or loop.is_closed():
+                    loop = self._loop = asyncio.get_running_loop()
+                    self._loop_thread_id = threading.get_ident()
+                future = self._cancelled_future = loop.create_future()
+                if self.is_cancelled:
+                    future.set_result(True)
+            return future
+    
+    def _resolve_cancelled_future(self, future: asyncio.Future):
+        """標記取消 Future 完成，必要時轉交給事件循環所在線程"""
+        loop = future.get_loop()
+        if loop.is_closed():
+            return
+        if threading.get_ident() == self._loop_thread_id:
+            if not future.done():
+                future.set_result(True)
+        else:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+    
+    def _schedule_async_callbacks(self, callbacks: tuple):
+        """將非同步回調一次性排入事件循環"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            coro = self._run_async_callbacks(callbacks)
+            if threading.get_ident() == self._loop_thread_id:
+                self._pending_callbacks.append(loop.create_task(coro))
+            else:
+                # 從其他線程取消時，透過線程安全的介面排程
+                future = asyncio.run_coroutine_threadsafe(coro, loop)
+                self._pending_callbacks.append(asyncio.wrap_future(future, loop=loop))
+            return
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 沒有執行中的事件循環，直接同步執行
+            asyncio.run(self._run_async_callbacks(callbacks))
+        else:
+            self._pending_callbacks.append(loop.create_task(self._run_async_callbacks(callbacks)))
+    
+    @staticmethod
+    async def _run_async_callbacks(callbacks: tuple):
+        """並行執行非同步回調，忽略個別回調的錯誤"""
+        await asyncio.gather(*(callback() for callback in callbacks), return_exceptions=True)
+    
+    async def wait_callbacks(self):
+        """等待已排程的非同步回調執行完成"""
+        pending, self._pending_callbacks = self._pending_callbacks, []
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
     
     def check(self):
         """檢查是否已取消，如果已取消則拋出異常"""
         if self.is_cancelled:
             raise CancellationException(self.reason.value)
     
+    def check_cancelled(self):
+        """檢查是否已取消，如果已取消則拋出 asyncio.CancelledError"""
+        if self.is_cancelled:
+            self._raise_cancelled()
+    
+    def check_cancelled_async(self) -> Awaitable[None]:
+        """
+        非同步版本的 check_cancelled，供 `await token.check_cancelled_async()` 使用
+        
+        未取消時返回共用的已完成物件，避免每次呼叫都建立協程。
+        """
+        if self.is_cancelled:
+            self._raise_cancelled()
+        return _COMPLETED
+    
+    def _raise_cancelled(self):
+        """拋出取消例外（僅在已取消時呼叫）"""
+        raise asyncio.CancelledError(self.reason.value if self.reason else None)
+    
     def add_callback(self, callback: Callable):
         """添加取消回調"""
+        is_async = asyncio.iscoroutinefunction(callback)
+        
         with self._lock:
-            self._callbacks.append(callback)
-            
-            # 如果已經取消，立即執行回調
-            if self.is_cancelled:
-                try:
-                    callback()
-                except Exception:
-                    pass
+            if not self.is_cancelled:
+                if is_async:
+                    self._async_callbacks.append(callback)
+                else:
+                    self._sync_callbacks.append(callback)
+                return
+        
+        # 如果已經取消，立即執行回調
+        if is_async:
+            self._schedule_async_callbacks((callback,))
+        else:
+            try:
+                callback()
+            except Exception:
+                pass
 
 class CancellationManager:
     """取消管理器"""
     def __init__(self):
         self._tokens: Dict[str, CancellationToken] = {}
+        # 已取消令牌依取消時間排序的 (cancelled_at, analysis_id) 最小堆，供清理使用
+        self._cancelled_heap: List[Tuple[int, str]] = []
+        # 堆中已被 remove_token 移除的項目數，超過一半時壓縮
+        self._stale_entries = 0
+        # 未取消的分析 ID，令牌取消時經由回調移除
+        self._active: Set[str] = set()
         self._lock = threading.Lock()  # 使用線程鎖
     
     async def create_token(self, analysis_id: Optional[str] = None) -> CancellationToken:
@@ -71,11 +210,39 @@ class CancellationManager:
         if not analysis_id:
             analysis_id = str(uuid.uuid4())
         
+        # 令牌綁定建立時所在線程的事件循環；應用程式會在多個線程上各自執行事件循環
+        loop = asyncio.get_running_loop()
         with self._lock:
-            token = CancellationToken(analysis_id)
+            token = CancellationToken(analysis_id, loop)
             self._tokens[analysis_id] = token
+            self._track_active(token)
             return token
     
+    async def create_tokens(self, analysis_ids: List[str]) -> List[CancellationToken]:
+        """批次創建取消令牌，整批只取得一次事件循環與鎖"""
+        loop = asyncio.get_running_loop()
+        tokens = [CancellationToken(analysis_id or str(uuid.uuid4()), loop) for analysis_id in analysis_ids]
+        
+        with self._lock:
+            self._tokens.update({token.analysis_id: token for token in tokens})
+            for token in tokens:
+                self._track_active(token)
+        return tokens
+    
+    def _track_active(self, token: CancellationToken):
+        """將令牌加入活躍集合，取消時移出並排入清理堆（呼叫時需持有鎖）"""
+        analysis_id = token.analysis_id
+        self._active.add(analysis_id)
+        
+        def on_cancelled():
+            with self._lock:
+                # 同一 ID 可能已被移除或被新令牌取代，僅在仍為目前令牌時處理
+                if self._tokens.get(analysis_id) is token:
+                    self._active.discard(analysis_id)
+                    heapq.heappush(self._cancelled_heap, (token.cancelled_at, analysis_id))
+        
+        token.add_callback(on_cancelled)
+    
     async def get_token(self, analysis_id: str) -> Optional[CancellationToken]:
         """獲取取消令牌"""
         with self._lock:
@@ -92,33 +259,75 @@ class CancellationManager:
     async def remove_token(self, analysis_id: str):
         """移除取消令牌"""
         with self._lock:
-            self._tokens.pop(analysis_id, None)
-    
-    async def cancel_all(self, reason: CancellationReason = CancellationReason.SYSTEM_SHUTDOWN):
-        """取消所有分析"""
-        async with self._lock:
-            for token in self._tokens.values():
-                if not token.is_cancelled:
-                    token.cancel(reason)
-    
-    async def cleanup_old_tokens(self, max_age_hours: int = 24):
-        """清理舊的取消令牌"""
-        async with self._lock:
-            now = datetime.now()
-            to_remove = []
-            
-            for analysis_id, token in self._tokens.items():
-                if token.cancelled_at:
-                    age = (now - token.cancelled_at).total_seconds() / 3600
-                    if age > max_age_hours:
-                        to_remove.append(analysis_id)
-            
-            for analysis_id in to_remove:
-                del self._tokens[analysis_id]
+            token = self._tokens.pop(analysis_id, None)
+            self._active.discard(analysis_id)
+            if token is not None and token.is_cancelled:
+                # 堆中的對應項目已失效，累積過多時重建堆
+                self._stale_entries += 1
+                if self._stale_entries * 2 > len(self._cancelled_heap):
+                    self._compact_cancelled_heap()
+    
+    def _compact_cancelled_heap(self):
+        """移除堆中已失效的項目（呼叫時需持有鎖）"""
+        heap = self._cancelled_heap
+        heap[:] = [
+            (cancelled_at, analysis_id) for cancelled_at, analysis_id in heap
+            if self._is_current(analysis_id, cancelled_at)
+        ]
+        heapq.heapify(heap)
+        self._stale_entries = 0
+    
+    def _is_current(self, analysis_id: str, cancelled_at: int) -> bool:
+        """堆項目是否仍對應到目前登記的已取消令牌"""
+        token = self._tokens.get(analysis_id)
+        return token is not None and token.cancelled_at == cancelled_at
+    
+    async def cancel_all(self, reason: CancellationReason = CancellationReason.SYSTEM_SHUTDOWN) -> int:
+        """
+        取消所有分析
+        
+        Returns:
+            取消的分析數量
+        """
+        with self._lock:
+            tokens = [token for token in self._tokens.values() if not token.is_cancelled]
+        
+        # 在鎖外取消，回調可再呼叫管理器的方法
+        for token in tokens:
+            token.cancel(reason)
+        return len(tokens)
+    
+    async def cleanup_old_tokens(self, max_age_seconds: float = 24 * 3600) -> int:
+        """
+        清理取消時間超過 max_age_seconds 的取消令牌，執行中的分析不受影響
+        
+        只從堆頂彈出過期項目，不需掃描全部令牌。
+        
+        Returns:
+            清理的令牌數量
+        """
+        cutoff = time.monotonic_ns() - int(max_age_seconds * _NS_PER_SECOND)
+        removed = 0
+        
+        with self._lock:
+            heap = self._cancelled_heap
+            while heap and heap[0][0] < cutoff:
+                cancelled_at, analysis_id = heapq.heappop(heap)
+                if self._is_current(analysis_id, cancelled_at):
+                    del self._tokens[analysis_id]
+                    removed += 1
+                elif self._stale_entries:
+                    self._stale_entries -= 1
+        
+        return removed
+    
+    def get_active_analyses(self) -> List[str]:
+        """獲取未取消的分析 ID 列表"""
+        return list(self._active)
     
     def get_active_count(self) -> int:
         """獲取活躍的分析數量"""
-        return sum(1 for token in self._tokens.values() if not token.is_cancelled)
+        return len(self._active)
     
     def get_cancelled_count(self) -> int:
         """獲取已取消的分析數量"""
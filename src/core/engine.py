@@ -19,7 +19,10 @@ from ..utils.logger import StructuredLogger
 from ..utils.health_checker import HealthChecker
 from ..utils.task_queue import TaskQueue, AnalysisTask
 from ..storage.result_storage import ResultStorage
-from .cancellation import CancellationToken, CancellationManager, CancellationReason, get_cancellation_manager
+from .cancellation import (
+    CancellationToken, CancellationManager, CancellationReason,
+    get_cancellation_manager, monotonic_ns_to_datetime
+)
 from .exceptions import (
     ProviderNotAvailableException, 
     CancellationException,
@@ -71,7 +74,7 @@ class AiAnalysisEngine:
             self.config.limits.max_queue_size
         )
         
-        self.logger.log_analysis("info", "引擎初始化完成", config=self.config.dict())
+        self.logger.log_analysis("info", "引擎初始化完成", config=self.config.model_dump(exclude_unset=True, mode="json"))
     
     def _init_wrappers(self):
         """初始化所有 wrapper"""
@@ -631,7 +634,7 @@ class CancellableAiAnalysisEngine(AiAnalysisEngine):
             analyses.append({
                 'id': analysis_id,
                 'is_cancelled': token.is_cancelled,
-                'cancelled_at': token.cancelled_at.isoformat() if token.cancelled_at else None,
+                'cancelled_at': monotonic_ns_to_datetime(token.cancelled_at).isoformat() if token.cancelled_at else None,
                 'reason': token.reason.value if token.reason else None
             })
         
@@ -644,7 +647,7 @@ class CancellableAiAnalysisEngine(AiAnalysisEngine):
     
     async def cleanup_completed_analyses(self, max_age_hours: int = 24):
         """清理已完成的分析"""
-        await self.cancellation_manager.cleanup_old_tokens(max_age_hours)
+        await self.cancellation_manager.cleanup_old_tokens(max_age_seconds=max_age_hours * 3600)
         
         # 也清理資料庫中的舊記錄
         await self.storage.cleanup_old_records(max_age_hours * 24 // 24)  # 轉換為天數
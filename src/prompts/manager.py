@@ -3,7 +3,10 @@ Prompt 管理器
 """
 import os
 import yaml
-from typing import Dict, Any, Optional, List
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterable, Mapping
 from pathlib import Path
 from datetime import datetime
 import json
@@ -11,44 +14,99 @@ import json
 from .templates import PromptTemplate
 from ..config.base import AnalysisMode, ModelProvider
 
+# 優先使用 LibYAML 的 C 實作；讀取只允許安全型別，輸出沿用完整 Dumper 以支援 tuple、Enum 等值
+try:
+    from yaml import CSafeLoader as YamlLoader, CDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, Dumper as YamlDumper
+
+# 並行讀取 prompt 檔案的最大線程數
+_LOAD_WORKERS = 8
+
+# 背景預取的最大線程數
+_PREFETCH_WORKERS = 2
+
+# Prompt 來源：給定目錄，回傳 (檔名, YAML 內容) 序列
+PromptLoader = Callable[[Path], Iterable[Tuple[str, bytes]]]
+
+def disk_loader(prompts_dir: Path) -> Iterable[Tuple[str, bytes]]:
+    """並行讀取目錄下所有 YAML 檔案（I/O 為主），依檔案順序回傳"""
+    if not prompts_dir.exists():
+        return
+    
+    yaml_files = list(prompts_dir.glob("*.yaml"))
+    if not yaml_files:
+        return
+    
+    with ThreadPoolExecutor(max_workers=min(_LOAD_WORKERS, len(yaml_files))) as executor:
+        futures = [executor.submit(yaml_file.read_bytes) for yaml_file in yaml_files]
+    
+    for yaml_file, future in zip(yaml_files, futures):
+        try:
+            yield yaml_file.name, future.result()
+        except OSError as e:
+            print(f"Error loading {yaml_file}: {e}")
+
+def dict_loader(files: Dict[str, Dict[str, Any]]) -> PromptLoader:
+    """
+    建立從記憶體字典載入 prompts 的 loader（不經過檔案系統）
+    
+    Args:
+        files: 檔名 -> 檔案內容（prompt 鍵值 -> prompt 資料）
+    """
+    contents = [
+        (name, yaml.dump(data, Dumper=YamlDumper, allow_unicode=True, encoding='utf-8'))
+        for name, data in files.items()
+    ]
+    return lambda prompts_dir: contents
+
 class PromptManager:
     """Prompt 管理器"""
     
-    def __init__(self, prompts_dir: str = None):
+    def __init__(self, prompts_dir: str = None, loader: PromptLoader = disk_loader):
         """
         初始化 Prompt 管理器
         
         Args:
             prompts_dir: Prompt 檔案目錄
+            loader: Prompt 來源，預設從 prompts_dir 讀取檔案
         """
         if prompts_dir is None:
             # 預設使用 src/prompts/data 目錄
             prompts_dir = Path(__file__).parent / "data"
         
         self.prompts_dir = Path(prompts_dir)
-        self.prompts_cache: Dict[str, PromptTemplate] = {}
+        self.loader = loader
+        # 經由 add/update/delete/import 修改，確保渲染快取同步清除
+        self._prompts: Dict[str, PromptTemplate] = {}
+        
+        # 渲染結果快取（有上限），prompts 變動時清除
+        self._render_cached = lru_cache(maxsize=512)(self._render)
+        # 背景預取：線程池在第一次預取時才建立，已排入的鍵值不重複提交
+        self._prefetch_executor: Optional[ThreadPoolExecutor] = None
+        self._prefetched: Dict[Tuple[str, str, Optional[str]], Future] = {}
         
         # 載入所有 prompts
         self._load_prompts()
     
+    @property
+    def prompts_cache(self) -> Mapping[str, PromptTemplate]:
+        """所有 prompt 模板的唯讀檢視"""
+        return MappingProxyType(self._prompts)
+    
     def _load_prompts(self):
         """載入所有 prompt 檔案"""
-        if not self.prompts_dir.exists():
-            return
-        
-        # 載入 YAML 檔案
-        for yaml_file in self.prompts_dir.glob("*.yaml"):
+        for name, content in self.loader(self.prompts_dir):
             try:
-                with open(yaml_file, 'r', encoding='utf-8') as f:
-                    data = yaml.safe_load(f)
+                data = yaml.load(content, Loader=YamlLoader)
                 
                 if data and isinstance(data, dict):
                     for key, prompt_data in data.items():
                         template = PromptTemplate.from_dict(prompt_data)
-                        self.prompts_cache[key] = template
+                        self._prompts[key] = template
                         
             except Exception as e:
-                print(f"Error loading {yaml_file}: {e}")
+                print(f"Error loading {name}: {e}")
     
     def get_prompt(self, 
                   log_type: str, 
@@ -74,30 +132,130 @@ class PromptManager:
         
         # 查找第一個匹配的 prompt
         for key in keys:
-            if key and key in self.prompts_cache:
-                return self.prompts_cache[key]
+            if key and key in self._prompts:
+                return self._prompts[key]
         
         return None
     
+    def render_prompt(self, key: str, **kwargs) -> Dict[str, str]:
+        """
+        渲染指定的 prompt 模板，相同參數的結果會被快取
+        
+        Args:
+            key: Prompt 鍵值
+            **kwargs: 變數值
+            
+        Returns:
+            包含 system_prompt 和 user_prompt 的字典
+        """
+        template = self._prompts.get(key)
+        if template is None:
+            raise KeyError(f"Prompt not found: {key}")
+        
+        # 鍵值帶上型別，避免 1、1.0、True 這類相等值共用快取結果；
+        # 並帶上模板內容，get_prompt 取得的模板被原地修改時不會拿到舊結果
+        items = tuple(sorted((name, type(value), value) for name, value in kwargs.items()))
+        content = (
+            template.system_prompt,
+            template.user_prompt,
+            tuple((name, type(value), value) for name, value in template.variables.items()),
+            tuple(template.required_variables)
+        )
+        try:
+            hash((items, content))
+        except TypeError:
+            # 變數值不可雜湊（如 list），直接渲染
+            return template.render(**kwargs)
+        return dict(self._render_cached(key, content, items))
+    
+    def _render(self, key: str, content: Tuple[Any, ...],
+                items: Tuple[Tuple[str, type, Any], ...]) -> Dict[str, str]:
+        """渲染 prompt 模板（content 僅作為快取鍵值的一部分）"""
+        return self._prompts[key].render(**{name: value for name, _, value in items})
+    
+    def render_many(self, key: str, batch: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        以多組變數批次渲染指定的 prompt 模板（不經過渲染快取）
+        
+        Args:
+            key: Prompt 鍵值
+            batch: 每次渲染的變數值
+            
+        Returns:
+            與 batch 順序相同的渲染結果
+        """
+        template = self._prompts.get(key)
+        if template is None:
+            raise KeyError(f"Prompt not found: {key}")
+        return template.render_many(batch)
+    
+    def prefetch(self,
+                 log_type: str,
+                 mode: AnalysisMode,
+                 provider: Optional[ModelProvider] = None) -> Future:
+        """
+        在背景預先解析下一個可能用到的 prompt（例如 QUICK 之後的 INTELLIGENT）
+        
+        立即返回，解析在預取線程中進行；同一組參數只會排入一次。
+        
+        Returns:
+            完成時結果為該 prompt 模板（找不到時為 None）的 Future
+        """
+        prefetch_key = (log_type, mode.value, provider.value if provider else None)
+        future = self._prefetched.get(prefetch_key)
+        if future is None:
+            if self._prefetch_executor is None:
+                self._prefetch_executor = ThreadPoolExecutor(
+                    max_workers=_PREFETCH_WORKERS, thread_name_prefix="prompt-prefetch"
+                )
+            future = self._prefetch_executor.submit(self._prefetch, log_type, mode, provider)
+            self._prefetched[prefetch_key] = future
+        return future
+    
+    def _prefetch(self,
+                  log_type: str,
+                  mode: AnalysisMode,
+                  provider: Optional[ModelProvider]) -> Optional[PromptTemplate]:
+        """查找 prompt 並預先解析其模板（在預取線程中執行）"""
+        template = self.get_prompt(log_type, mode, provider)
+        if template is not None:
+            template.precompile()
+        return template
+    
+    def shutdown(self, wait: bool = True):
+        """停止背景預取線程池"""
+        executor, self._prefetch_executor = self._prefetch_executor, None
+        self._prefetched.clear()
+        if executor is not None:
+            executor.shutdown(wait=wait)
+    
+    def _invalidate_render_cache(self):
+        """清除渲染結果快取與預取紀錄"""
+        self._render_cached.cache_clear()
+        self._prefetched.clear()
+    
     def add_prompt(self, key: str, template: PromptTemplate):
         """添加 prompt 模板"""
-        self.prompts_cache[key] = template
+        self._prompts[key] = template
+        self._invalidate_render_cache()
     
     def update_prompt(self, key: str, template: PromptTemplate):
         """更新 prompt 模板"""
-        if key in self.prompts_cache:
-            self.prompts_cache[key] = template
+        if key in self._prompts:
+            self._prompts[key] = template
             template.updated_at = datetime.now()
+            self._invalidate_render_cache()
     
     def delete_prompt(self, key: str):
         """刪除 prompt 模板"""
-        if key in self.prompts_cache:
-            del self.prompts_cache[key]
+        if key in self._prompts:
+            del self._prompts[key]
+            self._invalidate_render_cache()
     
     def list_prompts(self) -> List[Dict[str, Any]]:
         """列出所有 prompts"""
         prompts = []
-        for key, template in self.prompts_cache.items():
+        for key, template in self._prompts.items():
             prompts.append({
                 "key": key,
                 "name": template.name,
@@ -114,7 +272,7 @@ class PromptManager:
         query = query.lower()
         results = []
         
-        for key, template in self.prompts_cache.items():
+        for key, template in self._prompts.items():
             # 搜尋名稱、描述和標籤
             if (query in key.lower() or
                 query in template.name.lower() or
@@ -135,7 +293,7 @@ class PromptManager:
         
         # 按類型分組
         grouped_prompts = {}
-        for key, template in self.prompts_cache.items():
+        for key, template in self._prompts.items():
             # 從 key 中提取類型
             parts = key.split('_')
             if parts:
@@ -144,23 +302,25 @@ class PromptManager:
                     grouped_prompts[prompt_type] = {}
                 grouped_prompts[prompt_type][key] = template.to_dict()
         
-        # 保存到不同檔案
+        # 保存到不同檔案，每個檔案先序列化完成再一次寫入
         for prompt_type, prompts in grouped_prompts.items():
             output_file = output_dir / f"{prompt_type}_prompts.yaml"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                yaml.dump(prompts, f, default_flow_style=False, allow_unicode=True)
+            output_file.write_bytes(
+                yaml.dump(prompts, Dumper=YamlDumper, default_flow_style=False,
+                          allow_unicode=True, encoding='utf-8')
+            )
     
     def export_prompts(self, format: str = "json") -> str:
         """匯出所有 prompts"""
         data = {
             key: template.to_dict() 
-            for key, template in self.prompts_cache.items()
+            for key, template in self._prompts.items()
         }
         
         if format == "json":
             return json.dumps(data, ensure_ascii=False, indent=2, default=str)
         elif format == "yaml":
-            return yaml.dump(data, default_flow_style=False, allow_unicode=True)
+            return yaml.dump(data, Dumper=YamlDumper, default_flow_style=False, allow_unicode=True)
         else:
             raise ValueError(f"Unsupported format: {format}")
     
@@ -169,13 +329,15 @@ class PromptManager:
         if format == "json":
             prompts_data = json.loads(data)
         elif format == "yaml":
-            prompts_data = yaml.safe_load(data)
+            prompts_data = yaml.load(data, Loader=YamlLoader)
         else:
             raise ValueError(f"Unsupported format: {format}")
         
         for key, prompt_data in prompts_data.items():
             template = PromptTemplate.from_dict(prompt_data)
-            self.prompts_cache[key] = template
+            self._prompts[key] = template
+        
+        self._invalidate_render_cache()
     
     def validate_prompt(self, template: PromptTemplate) -> List[str]:
         """驗證 prompt 模板"""
@@ -188,15 +350,8 @@ class PromptManager:
         if not template.system_prompt and not template.user_prompt:
             errors.append("At least one of system_prompt or user_prompt is required")
         
-        # 檢查變數
-        all_vars = set()
-        if template.system_prompt:
-            all_vars.update(template._extract_variables(template.system_prompt))
-        if template.user_prompt:
-            all_vars.update(template._extract_variables(template.user_prompt))
-        
         # 確保所有變數都有預設值或在必要變數中
-        for var in all_vars:
+        for var in template.get_all_variables():
             if var not in template.variables and var not in template.required_variables:
                 errors.append(f"Variable '{var}' is not defined")
         
@@ -204,11 +359,11 @@ class PromptManager:
     
     def get_prompt_stats(self) -> Dict[str, Any]:
         """獲取 prompt 統計資訊"""
-        total = len(self.prompts_cache)
+        total = len(self._prompts)
         by_type = {}
         by_mode = {}
         
-        for key in self.prompts_cache:
+        for key in self._prompts:
             parts = key.split('_')
             
             # 統計類型
@@ -225,7 +380,7 @@ class PromptManager:
             "total": total,
             "by_type": by_type,
             "by_mode": by_mode,
-            "cache_size": len(str(self.prompts_cache))
+            "cache_size": len(str(self._prompts))
         }
 
 # 全局 prompt 管理器實例
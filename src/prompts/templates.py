@@ -1,11 +1,43 @@
 """
 Prompt 模板類別
 """
-from typing import Dict, Any, Optional, List, Set
+from typing import Dict, Any, Optional, List, FrozenSet, Tuple
 from datetime import datetime
 from dataclasses import dataclass, field
+from functools import lru_cache
 import re
 
+# 模板變數語法：{variable} 或 {variable|default}
+_VAR_PATTERN = re.compile(r'\{([^}]+)\}')
+# 只擷取變數名，忽略 |default 部分
+_VAR_NAME_PATTERN = re.compile(r'\{([^}|]+)(?:\|[^}]*)?\}')
+
+@lru_cache(maxsize=256)
+def _compile_template(template: str) -> Tuple[Tuple[str, ...], Tuple[Tuple[str, str], ...]]:
+    """
+    將模板字串預先拆解為文字片段與變數，結果依模板內容快取
+    
+    Returns:
+        (文字片段, (變數名, 預設值))，文字片段比變數多一個，兩者交錯組成原模板
+    """
+    parts = _VAR_PATTERN.split(template)
+    
+    placeholders = []
+    for var_expr in parts[1::2]:
+        # 檢查是否有預設值
+        if '|' in var_expr:
+            var_name, default_value = var_expr.split('|', 1)
+            placeholders.append((var_name.strip(), default_value.strip()))
+        else:
+            placeholders.append((var_expr.strip(), ''))
+    
+    return tuple(parts[0::2]), tuple(placeholders)
+
+@lru_cache(maxsize=256)
+def _template_variables(template: str) -> FrozenSet[str]:
+    """提取模板中的變數名，結果依模板內容快取"""
+    return frozenset(match.strip() for match in _VAR_NAME_PATTERN.findall(template))
+
 @dataclass
 class PromptTemplate:
     """Prompt 模板"""
@@ -32,7 +64,7 @@ class PromptTemplate:
             包含 system_prompt 和 user_prompt 的字典
         """
         # 檢查必要變數
-        missing_vars = set(self.required_variables) - set(kwargs.keys())
+        missing_vars = set(self.required_variables).difference(kwargs)
         if missing_vars:
             raise ValueError(f"Missing required variables: {missing_vars}")
         
@@ -51,6 +83,42 @@ class PromptTemplate:
         
         return result
     
+    def render_many(self, batch: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        以多組變數批次渲染 prompt 模板
+        
+        模板結構與必要變數只準備一次，適合同一模板套用到大量檔案。
+        
+        Args:
+            batch: 每次渲染的變數值
+            
+        Returns:
+            與 batch 順序相同的渲染結果
+        """
+        required = set(self.required_variables)
+        prompts = [
+            (prompt_key, _compile_template(template))
+            for prompt_key, template in (('system_prompt', self.system_prompt),
+                                         ('user_prompt', self.user_prompt))
+            if template
+        ]
+        defaults = self.variables
+        render_compiled = self._render_compiled
+        
+        results: List[Dict[str, str]] = [None] * len(batch)
+        for i, kwargs in enumerate(batch):
+            missing_vars = required.difference(kwargs)
+            if missing_vars:
+                raise ValueError(f"Missing required variables: {missing_vars}")
+            
+            context = {**defaults, **kwargs}
+            results[i] = {
+                prompt_key: render_compiled(compiled, context)
+                for prompt_key, compiled in prompts
+            }
+        
+        return results
+    
     def _render_template(self, template: str, context: Dict[str, Any]) -> str:
         """
         渲染單個模板字串
@@ -62,20 +130,17 @@ class PromptTemplate:
         Returns:
             渲染後的字串
         """
-        # 使用簡單的字串格式化
-        # 支援 {variable} 和 {variable|default} 語法
-        def replace_var(match):
-            var_expr = match.group(1)
-            
-            # 檢查是否有預設值
-            if '|' in var_expr:
-                var_name, default_value = var_expr.split('|', 1)
-                var_name = var_name.strip()
-                default_value = default_value.strip()
-            else:
-                var_name = var_expr.strip()
-                default_value = ''
-            
+        # 支援 {variable} 和 {variable|default} 語法，模板結構只解析一次
+        return self._render_compiled(_compile_template(template), context)
+    
+    @staticmethod
+    def _render_compiled(compiled: Tuple[Tuple[str, ...], Tuple[Tuple[str, str], ...]],
+                         context: Dict[str, Any]) -> str:
+        """以預先解析的模板結構渲染"""
+        literals, placeholders = compiled
+        
+        pieces = [literals[0]]
+        for (var_name, default_value), literal in zip(placeholders, literals[1:]):
             # 獲取值
             value = context.get(var_name, default_value)
             
@@ -84,32 +149,23 @@ class PromptTemplate:
                 value = default_value
             elif isinstance(value, (list, tuple)):
                 value = ', '.join(str(v) for v in value)
-            elif isinstance(value, dict):
-                value = str(value)
             
-            return str(value)
+            pieces.append(str(value))
+            pieces.append(literal)
         
-        # 替換所有變數
-        pattern = r'\{([^}]+)\}'
-        return re.sub(pattern, replace_var, template)
+        return ''.join(pieces)
     
-    def _extract_variables(self, template: str) -> Set[str]:
+    def _extract_variables(self, template: str) -> FrozenSet[str]:
         """提取模板中的變數名"""
-        pattern = r'\{([^}|]+)(?:\|[^}]*)?\}'
-        matches = re.findall(pattern, template)
-        return set(match.strip() for match in matches)
+        return _template_variables(template)
     
-    def get_all_variables(self) -> Set[str]:
+    def get_all_variables(self) -> FrozenSet[str]:
         """獲取所有變數名"""
-        all_vars = set()
-        
-        if self.system_prompt:
-            all_vars.update(self._extract_variables(self.system_prompt))
-        
-        if self.user_prompt:
-            all_vars.update(self._extract_variables(self.user_prompt))
-        
-        return all_vars
+        if not self.system_prompt:
+            return _template_variables(self.user_prompt) if self.user_prompt else frozenset()
+        if not self.user_prompt:
+            return _template_variables(self.system_prompt)
+        return _template_variables(self.system_prompt) | _template_variables(self.user_prompt)
     
     def validate(self) -> bool:
         """驗證模板是否有效"""
@@ -117,13 +173,15 @@ class PromptTemplate:
         if not self.system_prompt and not self.user_prompt:
             return False
         
-        # 檢查所有必要變數是否有預設值
-        all_vars = self.get_all_variables()
-        for req_var in self.required_variables:
-            if req_var not in all_vars:
-                return False
-        
-        return True
+        # 檢查所有必要變數是否都出現在模板中
+        return self.get_all_variables().issuperset(self.required_variables)
+    
+    def precompile(self):
+        """預先解析模板結構，讓第一次渲染不需再解析"""
+        for template in (self.system_prompt, self.user_prompt):
+            if template:
+                _compile_template(template)
+                _template_variables(template)
     
     def to_dict(self) -> Dict[str, Any]:
         """轉換為字典"""
@@ -1,7 +1,11 @@
 """
 成本計算器
 """
-from typing import Dict, List, Optional, Tuple
+import math
+import re
+import sys
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
@@ -9,9 +13,67 @@ from ..config.base import AnalysisMode, ModelProvider
 from ..config.anthropic_config import AnthropicApiConfig
 from ..config.openai_config import OpenApiConfig
 
-@dataclass
+# 近似 BPE 的預切分：ASCII 單字為一個 token，其餘非空白字元（中文、標點）各算一個
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+# 超過此長度的 ASCII 單字（hex dump、base64、長識別字）不再視為單一 token
+_LONG_RUN = 8
+# 長單字每個 token 約含的字元數
+_CHARS_PER_TOKEN = 4
+
+# 超過此長度的文本改用抽樣估算
+_SAMPLING_THRESHOLD = 4096
+# 抽樣視窗大小（字元）
+_SAMPLE_WINDOW = 2048
+
+# 各編碼每 KB 文本的平均 token 數（cl100k 約 4 字元/token，o200k 詞表較大、略少）
+_TOKENS_PER_KB = {
+    "cl100k_base": 256,
+    "o200k_base": 240
+}
+
+# 各模式的輸出/輸入 token 比例
+_OUTPUT_RATIO = {
+    AnalysisMode.QUICK: 0.2,        # 快速模式：輸出較少
+    AnalysisMode.INTELLIGENT: 0.4,  # 智能模式：中等輸出
+    AnalysisMode.LARGE_FILE: 0.5,   # 大檔模式：較多輸出
+    AnalysisMode.MAX_TOKEN: 0.8     # 深度模式：最多輸出
+}
+
+# 除各 provider 的模式預設模型外，比較成本時額外納入的模型
+_MODE_EXTRA_MODELS = {
+    AnalysisMode.QUICK: (
+        "claude-3-5-haiku-20241022",
+        "gpt-4o-mini",
+        "gpt-3.5-turbo"
+    ),
+    AnalysisMode.MAX_TOKEN: (
+        "claude-opus-4-20250514",
+        "gpt-4-turbo"
+    )
+}
+
+# 單次分析的最短時間（分鐘），至少包含一次 API 往返
+_MIN_ANALYSIS_MINUTES = 0.1
+
+# 各模式的有效 context window 比例
+_MODE_CONTEXT_RATIO = {
+    AnalysisMode.QUICK: 0.9,       # 快速模式：使用更多 context
+    AnalysisMode.INTELLIGENT: 0.7,  # 智能模式：標準比例
+    AnalysisMode.LARGE_FILE: 0.6,   # 大檔模式：保留更多空間
+    AnalysisMode.MAX_TOKEN: 0.5     # 深度模式：最保守
+}
+
+def _count_tokens(text: str, start: int, end: int) -> int:
+    """計算 text[start:end] 的近似 token 數，長單字依長度拆成多個 token"""
+    tokens = 0
+    for run in _TOKEN_RE.findall(text, start, end):
+        length = len(run)
+        tokens += 1 if length <= _LONG_RUN else -(-length // _CHARS_PER_TOKEN)
+    return tokens
+
+@dataclass(frozen=True, slots=True)
 class ModelCostInfo:
-    """模型成本資訊"""
+    """模型成本資訊（不可變，由所有 CostCalculator 實例共用）"""
     provider: str
     model: str
     tier: int
@@ -20,11 +82,28 @@ class ModelCostInfo:
     context_window: int
     speed_rating: int  # 1-5, 5 最快
     quality_rating: int  # 1-5, 5 最好
+    # Prompt 快取計價，None 表示不支援快取，以一般輸入價格計算
+    cached_input_cost_per_1k: Optional[float] = None  # 快取讀取
+    cache_write_cost_per_1k: Optional[float] = None   # 快取寫入
     
     @property
     def total_cost_per_1k(self) -> float:
         """每 1K tokens 的總成本"""
         return self.input_cost_per_1k + self.output_cost_per_1k
+    
+    @property
+    def effective_cached_input_cost_per_1k(self) -> float:
+        """每 1K 快取讀取 tokens 的實際成本"""
+        if self.cached_input_cost_per_1k is None:
+            return self.input_cost_per_1k
+        return self.cached_input_cost_per_1k
+    
+    @property
+    def effective_cache_write_cost_per_1k(self) -> float:
+        """每 1K 快取寫入 tokens 的實際成本"""
+        if self.cache_write_cost_per_1k is None:
+            return self.input_cost_per_1k
+        return self.cache_write_cost_per_1k
 
 @dataclass
 class CostEstimate:
@@ -42,6 +121,108 @@ class CostEstimate:
     warnings: List[str]
     api_calls: int = 1  # API 調用次數    
 
+# 模型成本資訊（價格為每 1k tokens）
+_MODEL_COST_CATALOG: Dict[str, ModelCostInfo] = {
+    # Anthropic 模型 (價格從每 million tokens 轉換為每 1k tokens)
+    "claude-3-5-haiku-20241022": ModelCostInfo(
+        provider="anthropic",
+        model="claude-3-5-haiku-20241022",
+        tier=2,
+        input_cost_per_1k=0.00025,  # $0.25 per million = $0.00025 per 1k
+        output_cost_per_1k=0.00125, # $1.25 per million = $0.00125 per 1k
+        context_window=200000,
+        speed_rating=5,
+        quality_rating=3,
+        cached_input_cost_per_1k=0.000025,  # $0.025 per million
+        cache_write_cost_per_1k=0.0003125  # $0.3125 per million
+    ),
+    "claude-3-5-sonnet-20241022": ModelCostInfo(
+        provider="anthropic",
+        model="claude-3-5-sonnet-20241022",
+        tier=3,
+        input_cost_per_1k=0.003,   # $3 per million = $0.003 per 1k
+        output_cost_per_1k=0.015,  # $15 per million = $0.015 per 1k
+        context_window=200000,
+        speed_rating=4,
+        quality_rating=4,
+        cached_input_cost_per_1k=0.0003,  # $0.30 per million
+        cache_write_cost_per_1k=0.00375  # $3.75 per million
+    ),
+    "claude-sonnet-4-20250514": ModelCostInfo(
+        provider="anthropic",
+        model="claude-sonnet-4-20250514",
+        tier=3,
+        input_cost_per_1k=0.005,   # $5 per million = $0.005 per 1k
+        output_cost_per_1k=0.025,  # $25 per million = $0.025 per 1k
+        context_window=200000,
+        speed_rating=4,
+        quality_rating=5,
+        cached_input_cost_per_1k=0.0005,  # $0.50 per million
+        cache_write_cost_per_1k=0.00625  # $6.25 per million
+    ),
+    "claude-opus-4-20250514": ModelCostInfo(
+        provider="anthropic",
+        model="claude-opus-4-20250514",
+        tier=4,
+        input_cost_per_1k=0.015,   # $15 per million = $0.015 per 1k
+        output_cost_per_1k=0.075,  # $75 per million = $0.075 per 1k
+        context_window=200000,
+        speed_rating=3,
+        quality_rating=5,
+        cached_input_cost_per_1k=0.0015,  # $1.50 per million
+        cache_write_cost_per_1k=0.01875  # $18.75 per million
+    ),
+    
+    # OpenAI 模型 (價格從每 million tokens 轉換為每 1k tokens)
+    "gpt-4o-mini": ModelCostInfo(
+        provider="openai",
+        model="gpt-4o-mini",
+        tier=2,
+        input_cost_per_1k=0.00015,  # $0.15 per million = $0.00015 per 1k
+        output_cost_per_1k=0.0006,  # $0.60 per million = $0.0006 per 1k
+        context_window=128000,
+        speed_rating=5,
+        quality_rating=3,
+        cached_input_cost_per_1k=0.000075  # $0.075 per million
+    ),
+    "gpt-4o": ModelCostInfo(
+        provider="openai",
+        model="gpt-4o",
+        tier=3,
+        input_cost_per_1k=0.0025,   # $2.50 per million = $0.0025 per 1k
+        output_cost_per_1k=0.01,    # $10 per million = $0.01 per 1k
+        context_window=128000,
+        speed_rating=4,
+        quality_rating=4,
+        cached_input_cost_per_1k=0.00125  # $1.25 per million
+    ),
+    "gpt-4-turbo": ModelCostInfo(
+        provider="openai",
+        model="gpt-4-turbo",
+        tier=4,
+        input_cost_per_1k=0.01,     # $10 per million = $0.01 per 1k
+        output_cost_per_1k=0.03,    # $30 per million = $0.03 per 1k
+        context_window=128000,
+        speed_rating=3,
+        quality_rating=5
+    ),
+    "gpt-3.5-turbo": ModelCostInfo(
+        provider="openai",
+        model="gpt-3.5-turbo",
+        tier=1,
+        input_cost_per_1k=0.0005,   # $0.50 per million = $0.0005 per 1k
+        output_cost_per_1k=0.0015,  # $1.50 per million = $0.0015 per 1k
+        context_window=16385,
+        speed_rating=5,
+        quality_rating=2
+    )
+}
+
+# 模組載入時建立一次、所有實例共用的唯讀表；模型名稱經 intern，查表時可直接比對指標
+_MODEL_COSTS: Mapping[str, ModelCostInfo] = MappingProxyType({
+    sys.intern(model): info for model, info in _MODEL_COST_CATALOG.items()
+})
+
 class CostCalculator:
     """成本計算器"""
     
@@ -51,99 +232,47 @@ class CostCalculator:
         self.anthropic_config = AnthropicApiConfig()
         self.openai_config = OpenApiConfig()
         
-        # 模型資訊快取
-        self._model_info_cache: Dict[str, ModelCostInfo] = {}
-        self._init_model_info()
-    
-    def _init_model_info(self):
-        """初始化模型資訊 - 修正價格單位"""
-        # Anthropic 模型 (價格從每 million tokens 轉換為每 1k tokens)
-        self._model_info_cache.update({
-            "claude-3-5-haiku-20241022": ModelCostInfo(
-                provider="anthropic",
-                model="claude-3-5-haiku-20241022",
-                tier=2,
-                input_cost_per_1k=0.00025,  # $0.25 per million = $0.00025 per 1k
-                output_cost_per_1k=0.00125, # $1.25 per million = $0.00125 per 1k
-                context_window=200000,
-                speed_rating=5,
-                quality_rating=3
-            ),
-            "claude-3-5-sonnet-20241022": ModelCostInfo(
-                provider="anthropic",
-                model="claude-3-5-sonnet-20241022",
-                tier=3,
-                input_cost_per_1k=0.003,   # $3 per million = $0.003 per 1k
-                output_cost_per_1k=0.015,  # $15 per million = $0.015 per 1k
-                context_window=200000,
-                speed_rating=4,
-                quality_rating=4
-            ),
-            "claude-sonnet-4-20250514": ModelCostInfo(
-                provider="anthropic",
-                model="claude-sonnet-4-20250514",
-                tier=3,
-                input_cost_per_1k=0.005,   # $5 per million = $0.005 per 1k
-                output_cost_per_1k=0.025,  # $25 per million = $0.025 per 1k
-                context_window=200000,
-                speed_rating=4,
-                quality_rating=5
-            ),
-            "claude-opus-4-20250514": ModelCostInfo(
-                provider="anthropic",
-                model="claude-opus-4-20250514",
-                tier=4,
-                input_cost_per_1k=0.015,   # $15 per million = $0.015 per 1k
-                output_cost_per_1k=0.075,  # $75 per million = $0.075 per 1k
-                context_window=200000,
-                speed_rating=3,
-                quality_rating=5
-            )
-        })
-        
-        # OpenAI 模型 (價格從每 million tokens 轉換為每 1k tokens)
-        self._model_info_cache.update({
-            "gpt-4o-mini": ModelCostInfo(
-                provider="openai",
-                model="gpt-4o-mini",
-                tier=2,
-                input_cost_per_1k=0.00015,  # $0.15 per million = $0.00015 per 1k
-                output_cost_per_1k=0.0006,  # $0.60 per million = $0.0006 per 1k
-                context_window=128000,
-                speed_rating=5,
-                quality_rating=3
-            ),
-            "gpt-4o": ModelCostInfo(
-                provider="openai",
-                model="gpt-4o",
-                tier=3,
-                input_cost_per_1k=0.0025,   # $2.50 per million = $0.0025 per 1k
-                output_cost_per_1k=0.01,    # $10 per million = $0.01 per 1k
-                context_window=128000,
-                speed_rating=4,
-                quality_rating=4
-            ),
-            "gpt-4-turbo": ModelCostInfo(
-                provider="openai",
-                model="gpt-4-turbo",
-                tier=4,
-                input_cost_per_1k=0.01,     # $10 per million = $0.01 per 1k
-                output_cost_per_1k=0.03,    # $30 per million = $0.03 per 1k
-                context_window=128000,
-                speed_rating=3,
-                quality_rating=5
-            ),
-            "gpt-3.5-turbo": ModelCostInfo(
-                provider="openai",
-                model="gpt-3.5-turbo",
-                tier=1,
-                input_cost_per_1k=0.0005,   # $0.50 per million = $0.0005 per 1k
-                output_cost_per_1k=0.0015,  # $1.50 per million = $0.0015 per 1k
-                context_window=16385,
-                speed_rating=5,
-                quality_rating=2
+        # 模型資訊
+        self.model_costs: Mapping[str, ModelCostInfo] = self._load_model_costs()
+        
+        # 各模式需要比較的模型，初始化時預先建立
+        self._mode_models: Dict[AnalysisMode, Tuple[str, ...]] = {
+            mode: self._resolve_mode_models(mode) for mode in AnalysisMode
+        }
+        
+        # 各模式模型的每 token 單價，以平行陣列存放 (輸入單價, 輸出單價)
+        self._mode_rates: Dict[AnalysisMode, Tuple[Tuple[float, ...], Tuple[float, ...]]] = {
+            mode: (
+                tuple(self.model_costs[model].input_cost_per_1k / 1000 for model in models),
+                tuple(self.model_costs[model].output_cost_per_1k / 1000 for model in models)
             )
-        })
+            for mode, models in self._mode_models.items()
+        }
+    
+    def _load_model_costs(self) -> Mapping[str, ModelCostInfo]:
+        """載入模型成本資訊（預設為共用的內建唯讀表）"""
+        return _MODEL_COSTS
+    
+    def _resolve_mode_models(self, mode: AnalysisMode) -> Tuple[str, ...]:
+        """獲取模式相關且有成本資訊的模型（去除重複、保留順序）"""
+        candidates = (
+            self.anthropic_config.get_model_for_mode(mode),
+            self.openai_config.get_model_for_mode(mode),
+            *_MODE_EXTRA_MODELS.get(mode, ())
+        )
+        return tuple(model for model in dict.fromkeys(candidates) if model in self.model_costs)
+    
+    def _get_model_info(self, model: str) -> Tuple[str, ModelCostInfo]:
+        """
+        查詢模型成本資訊，命中後才將名稱 intern
+        
+        Returns:
+            (intern 後的模型名稱, 成本資訊)；非字串或未知模型拋出 ValueError
+        """
+        model_info = self.model_costs.get(model) if isinstance(model, str) else None
+        if model_info is None:
+            raise ValueError(f"Unknown model: {model}")
+        return sys.intern(str(model)), model_info
     
     def estimate_tokens(self, file_size_kb: float, provider: ModelProvider) -> Tuple[int, int]:
         """
@@ -166,30 +295,130 @@ class CostCalculator:
             # 使用 GPT 的標準：約 4 字符/token
             input_tokens = int(chars / 4)
         
-        # 輸出 tokens 估算：根據分析模式調整
-        output_ratio = {
-            AnalysisMode.QUICK: 0.2,      # 快速模式：輸出較少
-            AnalysisMode.INTELLIGENT: 0.4, # 智能模式：中等輸出
-            AnalysisMode.LARGE_FILE: 0.5,  # 大檔模式：較多輸出
-            AnalysisMode.MAX_TOKEN: 0.8    # 深度模式：最多輸出
-        }
-        
         # 預設使用 intelligent 模式的比例
-        output_tokens = int(input_tokens * 0.4)
+        output_tokens = int(input_tokens * _OUTPUT_RATIO[AnalysisMode.INTELLIGENT])
         
         return input_tokens, output_tokens
     
+    def estimate_tokens_from_text(self, text: str) -> int:
+        """
+        估算文本的 token 數量
+        
+        短文本直接計數；長文本（如大型 ANR/Tombstone 日誌）只計數
+        約 sqrt(N) 個均勻分布的視窗，再依字元比例外推。
+        
+        Args:
+            text: 文本內容
+            
+        Returns:
+            估算的 token 數
+        """
+        length = len(text)
+        if length < _SAMPLING_THRESHOLD:
+            return _count_tokens(text, 0, length)
+        
+        windows = max(8, int(math.sqrt(length / 1024)))
+        if windows * _SAMPLE_WINDOW >= length:
+            return _count_tokens(text, 0, length)
+        
+        # 視窗起點均勻分布在 [0, length - _SAMPLE_WINDOW]
+        step = (length - _SAMPLE_WINDOW) / (windows - 1)
+        sampled_tokens = 0
+        for i in range(windows):
+            start = int(i * step)
+            sampled_tokens += _count_tokens(text, start, start + _SAMPLE_WINDOW)
+        
+        return int(length * sampled_tokens / (windows * _SAMPLE_WINDOW))
+    
+    def estimate_tokens_from_file_size(self, file_size_kb: float, encoding: str = "cl100k_base") -> int:
+        """
+        根據檔案大小估算 token 數量
+        
+        Args:
+            file_size_kb: 檔案大小（KB）
+            encoding: tokenizer 編碼名稱
+            
+        Returns:
+            估算的 token 數
+        """
+        return int(file_size_kb * _TOKENS_PER_KB[encoding])
+    
+    def estimate_analysis_time(self, file_size_kb: float, mode: AnalysisMode,
+                               estimated_tokens: Optional[int] = None,
+                               model: Optional[str] = None) -> float:
+        """
+        估算分析時間，與 calculate_cost 的 analysis_time_estimate 使用相同公式
+        
+        Args:
+            file_size_kb: 檔案大小（KB）
+            mode: 分析模式
+            estimated_tokens: 已估算的輸入 token 數，未提供時依檔案大小估算
+            model: 模型名稱，預設為該模式的主要模型
+            
+        Returns:
+            預估時間（分鐘）
+        """
+        if model is None:
+            model = self._mode_models[mode][0]
+        model, model_info = self._get_model_info(model)
+        
+        tokens = estimated_tokens
+        if tokens is None:
+            tokens, _ = self.estimate_tokens(file_size_kb, ModelProvider(model_info.provider))
+        api_calls = self.calculate_api_calls_for_mode(tokens, model_info.context_window, mode)
+        return self._analysis_minutes(file_size_kb, model_info, api_calls)
+    
+    @staticmethod
+    def _analysis_minutes(file_size_kb: float, model_info: ModelCostInfo, api_calls: int) -> float:
+        """依模型速度評級、檔案大小和 API 調用次數估算處理時間（分鐘）"""
+        base_time = file_size_kb / 100  # 基礎時間：每 100KB 1 分鐘
+        speed_factor = 6 - model_info.speed_rating  # 速度因子
+        api_call_overhead = (api_calls - 1) * 0.5  # 每個額外 API 調用增加 0.5 分鐘
+        return max(_MIN_ANALYSIS_MINUTES, base_time * speed_factor + api_call_overhead)
+    
+    def token_upper_bound(self, text: str) -> int:
+        """
+        不需計數即可得到的 token 數上限
+        
+        byte-level BPE 的每個 token 至少包含一個 UTF-8 位元組，因此位元組數不會小於 token 數；
+        中文等非 ASCII 字元一個字元可能拆成多個 token，字元數不是上限。
+        """
+        return len(text.encode('utf-8'))
+    
+    def validate_token_count(self, model: str, input_tokens: Optional[int] = None, *,
+                             text: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        檢查輸入 tokens 是否超過模型的 context window
+        
+        Args:
+            model: 模型名稱
+            input_tokens: 輸入 tokens，未提供時由 text 估算
+            text: 輸入文本；UTF-8 位元組數已在 context window 內時不需估算 tokens
+            
+        Returns:
+            (是否有效, 錯誤訊息)；未知模型視為有效
+        """
+        model_info = self.model_costs.get(model)
+        if model_info is None:
+            return True, ""
+        
+        if input_tokens is None:
+            if text is None:
+                raise ValueError("Either input_tokens or text is required")
+            # 上限已在 context window 內即可確定有效；否則取（長文本為抽樣的）估算
+            # 與每 4 字元一個 token 的保守下限中較大者，避免抽樣低估
+            if self.token_upper_bound(text) <= model_info.context_window:
+                return True, ""
+            input_tokens = max(self.estimate_tokens_from_text(text), len(text) // _CHARS_PER_TOKEN)
+        
+        if input_tokens > model_info.context_window:
+            return False, f"Input {input_tokens} tokens exceeds context window {model_info.context_window} of {model}"
+        return True, ""
+    
     def calculate_api_calls_for_mode(self, total_tokens: int, context_window: int, mode: AnalysisMode) -> int:
         """根據模式計算需要的 API 調用次數"""
         # 根據模式調整有效 context window
-        mode_context_ratio = {
-            AnalysisMode.QUICK: 0.9,       # 快速模式：使用更多 context
-            AnalysisMode.INTELLIGENT: 0.7,  # 智能模式：標準比例
-            AnalysisMode.LARGE_FILE: 0.6,   # 大檔模式：保留更多空間
-            AnalysisMode.MAX_TOKEN: 0.5     # 深度模式：最保守
-        }
-        
-        ratio = mode_context_ratio.get(mode, 0.7)
+        ratio = _MODE_CONTEXT_RATIO.get(mode, 0.7)
         effective_context = int(context_window * ratio)
         
         # 計算需要的 API 調用次數
@@ -200,23 +429,20 @@ class CostCalculator:
     def calculate_cost(self, file_size_kb: float, model: str, 
                       budget: float = 10.0, mode: AnalysisMode = AnalysisMode.INTELLIGENT) -> CostEstimate:
         """計算單一模型的成本"""
-        if model not in self._model_info_cache:
-            raise ValueError(f"Unknown model: {model}")
+        model, model_info = self._get_model_info(model)
         
-        model_info = self._model_info_cache[model]
         provider = ModelProvider(model_info.provider)
         
         # 估算 tokens
-        input_tokens, output_tokens = self.estimate_tokens(file_size_kb, provider)
+        input_tokens, _ = self.estimate_tokens(file_size_kb, provider)
         
+        return self._build_estimate(file_size_kb, model, model_info, input_tokens, budget, mode)
+    
+    def _build_estimate(self, file_size_kb: float, model: str, model_info: ModelCostInfo,
+                        input_tokens: int, budget: float, mode: AnalysisMode) -> CostEstimate:
+        """根據已估算的輸入 tokens 計算成本估算結果"""
         # 根據模式調整輸出 tokens
-        output_ratio = {
-            AnalysisMode.QUICK: 0.2,
-            AnalysisMode.INTELLIGENT: 0.4,
-            AnalysisMode.LARGE_FILE: 0.5,
-            AnalysisMode.MAX_TOKEN: 0.8
-        }
-        output_tokens = int(input_tokens * output_ratio.get(mode, 0.4))
+        output_tokens = int(input_tokens * _OUTPUT_RATIO.get(mode, 0.4))
         
         # 計算成本
         input_cost = (input_tokens / 1000.0) * model_info.input_cost_per_1k
@@ -227,10 +453,7 @@ class CostCalculator:
         api_calls = self.calculate_api_calls_for_mode(input_tokens, model_info.context_window, mode)
         
         # 估算處理時間（基於模型速度評級、檔案大小和 API 調用次數）
-        base_time = file_size_kb / 100  # 基礎時間：每 100KB 1 分鐘
-        speed_factor = 6 - model_info.speed_rating  # 速度因子
-        api_call_overhead = (api_calls - 1) * 0.5  # 每個額外 API 調用增加 0.5 分鐘
-        analysis_time = (base_time * speed_factor) + api_call_overhead
+        analysis_time = self._analysis_minutes(file_size_kb, model_info, api_calls)
         
         # 檢查預算和生成警告
         warnings = []
@@ -260,69 +483,178 @@ class CostCalculator:
             api_calls=api_calls
         )
     
+    def calculate_single_model_cost(self, model: str, input_tokens: int, output_tokens: int,
+                                    cached_input_tokens: int = 0,
+                                    cache_write_tokens: int = 0) -> Dict[str, Any]:
+        """
+        根據實際 token 數計算單一模型的成本
+        
+        Args:
+            model: 模型名稱
+            input_tokens: 一般輸入 tokens（不含快取讀寫）
+            output_tokens: 輸出 tokens
+            cached_input_tokens: 從 prompt 快取讀取的輸入 tokens
+            cache_write_tokens: 寫入 prompt 快取的輸入 tokens
+            
+        Returns:
+            成本明細
+        """
+        model, model_info = self._get_model_info(model)
+        
+        input_cost = (input_tokens / 1000.0) * model_info.input_cost_per_1k
+        output_cost = (output_tokens / 1000.0) * model_info.output_cost_per_1k
+        cached_input_cost = (cached_input_tokens / 1000.0) * model_info.effective_cached_input_cost_per_1k
+        cache_write_cost = (cache_write_tokens / 1000.0) * model_info.effective_cache_write_cost_per_1k
+        
+        return {
+            "model": model,
+            "provider": model_info.provider,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_input_tokens": cached_input_tokens,
+            "cache_write_tokens": cache_write_tokens,
+            "input_cost": input_cost,
+            "output_cost": output_cost,
+            "cached_input_cost": cached_input_cost,
+            "cache_write_cost": cache_write_cost,
+            "total_cost": input_cost + output_cost + cached_input_cost + cache_write_cost
+        }
+    
     def compare_models_cost(self, file_size_kb: float, mode: AnalysisMode, 
                            budget: float = 10.0) -> List[Dict[str, any]]:
         """比較不同模型的成本"""
-        comparisons = []
-        
-        # 獲取適合該模式的模型
-        anthropic_model = self.anthropic_config.get_model_for_mode(mode)
-        openai_model = self.openai_config.get_model_for_mode(mode)
-        
-        # 計算所有相關模型的成本
-        relevant_models = set()
-        
-        # 添加模式對應的模型
-        relevant_models.add(anthropic_model)
-        relevant_models.add(openai_model)
-        
-        # 根據模式添加其他可能的模型
-        if mode == AnalysisMode.QUICK:
-            relevant_models.update([
-                "claude-3-5-haiku-20241022",
-                "gpt-4o-mini",
-                "gpt-3.5-turbo"
-            ])
-        elif mode == AnalysisMode.MAX_TOKEN:
-            relevant_models.update([
-                "claude-opus-4-20250514",
-                "gpt-4-turbo"
-            ])
-        
-        # 計算每個模型的成本
-        for model in relevant_models:
-            if model in self._model_info_cache:
-                try:
-                    estimate = self.calculate_cost(file_size_kb, model, budget, mode)
-                    model_info = self._model_info_cache[model]
-                    
-                    comparisons.append({
-                        "provider": estimate.provider,
-                        "model": model,
-                        "tier": model_info.tier,
-                        "total_cost": round(estimate.total_cost, 4),
-                        "input_cost": round(estimate.input_cost, 4),
-                        "output_cost": round(estimate.output_cost, 4),
-                        "analysis_time_estimate": round(estimate.analysis_time_estimate, 1),
-                        "is_within_budget": estimate.is_within_budget,
-                        "quality_rating": model_info.quality_rating,
-                        "speed_rating": model_info.speed_rating,
-                        "warnings": estimate.warnings,
-                        "api_calls": estimate.api_calls,
-                        "tokens_per_api_call": int(model_info.context_window * 0.7)
-                    })
-                except Exception:
-                    continue
-        
-        # 按成本排序
-        comparisons.sort(key=lambda x: x["total_cost"])
-        
-        return comparisons
+        # (未四捨五入的總成本, 比較結果)
+        comparisons: List[Tuple[float, Dict[str, Any]]] = []
+        
+        # 模式相關的模型已在初始化時建立
+        mode_models = self._mode_models.get(mode)
+        if mode_models is None:
+            mode_models = self._resolve_mode_models(mode)
+        
+        # 計算每個模型的成本，輸入 tokens 每個 provider 只估算一次
+        input_tokens_by_provider: Dict[str, int] = {}
+        for model in mode_models:
+            model_info = self.model_costs[model]
+            try:
+                input_tokens = input_tokens_by_provider.get(model_info.provider)
+                if input_tokens is None:
+                    input_tokens, _ = self.estimate_tokens(file_size_kb, ModelProvider(model_info.provider))
+                    input_tokens_by_provider[model_info.provider] = input_tokens
+                
+                estimate = self._build_estimate(file_size_kb, model, model_info, input_tokens, budget, mode)
+                
+                comparisons.append((estimate.total_cost, {
+                    "provider": estimate.provider,
+                    "model": model,
+                    "tier": model_info.tier,
+                    "total_cost": round(estimate.total_cost, 4),
+                    "cost_per_1k_tokens": model_info.total_cost_per_1k,
+                    "input_cost": round(estimate.input_cost, 4),
+                    "output_cost": round(estimate.output_cost, 4),
+                    "analysis_time_estimate": round(estimate.analysis_time_estimate, 1),
+                    "is_within_budget": estimate.is_within_budget,
+                    "quality_rating": model_info.quality_rating,
+                    "speed_rating": model_info.speed_rating,
+                    "warnings": estimate.warnings,
+                    "api_calls": estimate.api_calls,
+                    "tokens_per_api_call": int(model_info.context_window * 0.7)
+                }))
+            except Exception:
+                continue
+        
+        # 按未四捨五入的成本排序，並以其計算相對最便宜模型的成本倍數
+        comparisons.sort(key=lambda x: x[0])
+        
+        if comparisons:
+            cheapest = comparisons[0][0]
+            for total_cost, comparison in comparisons:
+                comparison["relative_cost"] = (
+                    round(total_cost / cheapest, 2) if cheapest > 0 else 1.0
+                )
+        
+        return [comparison for _, comparison in comparisons]
+    
+    def get_cheapest_model(self, mode: AnalysisMode, input_tokens: int = 1000,
+                           output_tokens: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        獲取指定模式下成本最低的模型
+        
+        Args:
+            mode: 分析模式
+            input_tokens: 輸入 tokens
+            output_tokens: 輸出 tokens，預設依模式的輸出比例估算
+            
+        Returns:
+            最便宜模型的資訊，沒有可用模型時為 None
+        """
+        if output_tokens is None:
+            output_tokens = int(input_tokens * _OUTPUT_RATIO.get(mode, 0.4))
+        
+        cheapest = self._cheapest_for_mode(mode, input_tokens, output_tokens)
+        if cheapest is None:
+            return None
+        model, total_cost = cheapest
+        
+        return {
+            "model": model,
+            "provider": self.model_costs[model].provider,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_cost": total_cost
+        }
+    
+    def _cheapest_for_mode(self, mode: AnalysisMode, input_tokens: int,
+                           output_tokens: int) -> Optional[Tuple[str, float]]:
+        """以預先計算的單價陣列找出模式下成本最低的模型及其成本"""
+        models = self._mode_models.get(mode)
+        if not models:
+            return None
+        input_rates, output_rates = self._mode_rates[mode]
+        
+        totals = [
+            input_tokens * input_rate + output_tokens * output_rate
+            for input_rate, output_rate in zip(input_rates, output_rates)
+        ]
+        best = min(range(len(totals)), key=totals.__getitem__)
+        return models[best], totals[best]
+    
+    def get_budget_recommendations(self, budget_usd: float, file_size_kb: float) -> Dict[str, Any]:
+        """
+        根據預算推薦各模式下最划算的模型
+        
+        Args:
+            budget_usd: 預算（美元）
+            file_size_kb: 檔案大小（KB）
+            
+        Returns:
+            包含預算、估算 tokens 及各模式推薦的字典；
+            成本為零（免費）時 analyses_possible 為 None，表示不受預算限制
+        """
+        tokens = self.estimate_tokens_from_file_size(file_size_kb)
+        output_tokens = tokens // 2
+        
+        recommendations = {}
+        for mode in AnalysisMode:
+            cheapest = self._cheapest_for_mode(mode, tokens, output_tokens)
+            if cheapest is None:
+                continue
+            model, cost = cheapest
+            recommendations[mode.value] = {
+                "model": model,
+                "cost_per_analysis": cost,
+                "analyses_possible": int(budget_usd // cost) if cost > 0 else None
+            }
+        
+        return {
+            "budget": budget_usd,
+            "estimated_tokens": tokens,
+            "recommendations": recommendations
+        }
     
     def get_tier_models(self, tier: int) -> List[str]:
         """獲取指定層級的所有模型"""
         return [
-            model for model, info in self._model_info_cache.items()
+            model for model, info in self.model_costs.items()
             if info.tier == tier
         ]
     
@@ -348,6 +680,20 @@ class CostCalculator:
         
         return within_budget[0]["model"] if within_budget else None
     
+    def format_cost_breakdown(self, model: str, input_tokens: int, output_tokens: int) -> str:
+        """格式化單一模型的成本明細"""
+        model, model_info = self._get_model_info(model)
+        
+        input_cost = (input_tokens / 1000.0) * model_info.input_cost_per_1k
+        output_cost = (output_tokens / 1000.0) * model_info.output_cost_per_1k
+        
+        return (
+            f"Model: {model} ({model_info.provider})\n"
+            f"Input: {input_tokens:,} tokens = ${input_cost:,.6f}\n"
+            f"Output: {output_tokens:,} tokens = ${output_cost:,.6f}\n"
+            f"Total: ${input_cost + output_cost:,.6f}"
+        )
+    
     def format_cost_summary(self, estimate: CostEstimate) -> str:
         """格式化成本摘要"""
         lines = [
@@ -21,15 +21,29 @@ from utils.status_manager import EnhancedStatusManager
 from utils.cache_manager import CacheManager
 from core.cancellation import CancellationToken, CancellationManager
 from storage.database import Database
+from tests.fixtures.stream_events import content_block_delta
 
 # Pytest configuration
 pytest_plugins = ['pytest_asyncio']
 
 
 @pytest.fixture(scope="session")
-def event_loop():
-    """Create an instance of the default event loop for the test session."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
+def event_loop_policy():
+    """Use uvloop's event loop policy when available, else the default one."""
+    if sys.platform != "win32":
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            return uvloop.EventLoopPolicy()
+    return asyncio.DefaultEventLoopPolicy()
+
+
+@pytest.fixture(scope="session")
+def event_loop(event_loop_policy):
+    """Create an instance of the event loop for the test session."""
+    loop = event_loop_policy.new_event_loop()
     yield loop
     loop.close()
 
@@ -41,10 +55,22 @@ def temp_dir():
         yield Path(tmpdir)
 
 
+@pytest.fixture(scope="session")
+def _system_config_template():
+    """Build the default system configuration once per session"""
+    return SystemConfig()
+
+
 @pytest.fixture
-def test_config(temp_dir):
+def system_config(_system_config_template):
+    """Fresh, independently mutable copy of the default system configuration"""
+    return _system_config_template.model_copy(deep=True)
+
+
+@pytest.fixture
+def test_config(system_config, temp_dir):
     """Create test configuration"""
-    config = SystemConfig()
+    config = system_config
     config.api_keys.anthropic = "test_anthropic_key"
     config.api_keys.openai = "test_openai_key"
     config.cache.directory = str(temp_dir / "cache")
@@ -90,11 +116,9 @@ def cancellation_token():
 
 
 @pytest.fixture
-async def cancellation_manager():
+def cancellation_manager():
     """Create cancellation manager"""
-    manager = CancellationManager()
-    yield manager
-    await manager.cancel_all()
+    return CancellationManager()
 
 
 @pytest.fixture
@@ -119,7 +143,7 @@ def mock_anthropic_client():
         async def mock_stream():
             events = [
                 Mock(type='message_start', usage=Mock(input_tokens=100)),
-                Mock(type='content_block_delta', delta=Mock(text='Test analysis result')),
+                content_block_delta('Test analysis result'),
                 Mock(type='message_delta', usage=Mock(output_tokens=50))
             ]
             for event in events:
@@ -151,7 +175,7 @@ def mock_openai_client():
         yield client
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_anr_log():
     """Sample ANR log content"""
     return """
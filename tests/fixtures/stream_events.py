@@ -0,0 +1,22 @@
+"""
+Lightweight streaming event objects for mocked AI clients
+"""
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True, frozen=True)
+class Delta:
+    """Text delta carried by a content block event"""
+    text: str
+
+
+@dataclass(slots=True, frozen=True)
+class ContentBlockDelta:
+    """Anthropic `content_block_delta` stream event"""
+    delta: Delta
+    type: str = field(default='content_block_delta')
+
+
+def content_block_delta(text: str) -> ContentBlockDelta:
+    """Build a content block delta event carrying `text`"""
+    return ContentBlockDelta(delta=Delta(text))
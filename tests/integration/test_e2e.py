@@ -12,6 +12,7 @@ from core.engine import AiAnalysisEngine
 from api.app import create_app
 from config.base import AnalysisMode, ModelProvider
 from storage.database import Database
+from tests.fixtures.stream_events import content_block_delta
 
 
 class TestE2EScenarios:
@@ -34,7 +35,7 @@ class TestE2EScenarios:
                 # Setup mock responses
                 async def mock_anthropic_stream():
                     yield Mock(type='message_start', usage=Mock(input_tokens=100))
-                    yield Mock(type='content_block_delta', delta=Mock(text='Anthropic analysis result'))
+                    yield content_block_delta('Anthropic analysis result')
                     yield Mock(type='message_delta', usage=Mock(output_tokens=50))
                 
                 async def mock_openai_stream():
@@ -132,10 +133,7 @@ class TestE2EScenarios:
         # Mock slow streaming
         async def slow_stream():
             for i in range(10):
-                yield Mock(
-                    type='content_block_delta',
-                    delta=Mock(text=f'Chunk {i} ')
-                )
+                yield content_block_delta(f'Chunk {i} ')
                 await asyncio.sleep(0.1)
         
         # Patch the engine's wrapper
@@ -485,7 +483,7 @@ class TestE2EScenarios:
                 raise Exception("Temporary network error")
             else:
                 # Success on third attempt
-                yield Mock(type='content_block_delta', delta=Mock(text='Recovery successful'))
+                yield content_block_delta('Recovery successful')
         
         engine._wrappers[ModelProvider.ANTHROPIC]._client.messages.create = AsyncMock(
             side_effect=flaky_stream
@@ -3,12 +3,20 @@ Integration tests for AI Analysis Engine
 """
 import pytest
 import asyncio
+import collections
 from unittest.mock import Mock, AsyncMock, patch
 import time
 
 from core.engine import AiAnalysisEngine
 from config.base import AnalysisMode, ModelProvider
 from core.cancellation import CancellationManager
+from tests.fixtures.stream_events import content_block_delta
+
+
+@pytest.fixture(scope="module")
+def anr_variants(sample_anr_log):
+    """Distinct ANR inputs for concurrency tests, built once per module"""
+    return tuple(f"{sample_anr_log}\n// Variant {i}" for i in range(3))
 
 
 class TestAiAnalysisEngine:
@@ -65,29 +73,26 @@ class TestAiAnalysisEngine:
         engine.set_provider(ModelProvider.ANTHROPIC)
         assert engine._current_provider == ModelProvider.ANTHROPIC
         
-        # Analyze with Anthropic
-        anthropic_result = []
-        async for chunk in engine.analyze(
-            content=sample_anr_log,
-            log_type='anr',
-            mode=AnalysisMode.QUICK,
-            provider=ModelProvider.ANTHROPIC
-        ):
-            anthropic_result.append(chunk)
-        
         # Switch to OpenAI
         engine.set_provider(ModelProvider.OPENAI)
         assert engine._current_provider == ModelProvider.OPENAI
         
-        # Analyze with OpenAI
-        openai_result = []
-        async for chunk in engine.analyze(
-            content=sample_anr_log,
-            log_type='anr',
-            mode=AnalysisMode.QUICK,
-            provider=ModelProvider.OPENAI
-        ):
-            openai_result.append(chunk)
+        # Analyze with both providers concurrently; each call names its
+        # provider explicitly so they do not depend on each other
+        anthropic_result, openai_result = await asyncio.gather(
+            self._collect_chunks(engine.analyze(
+                content=sample_anr_log,
+                log_type='anr',
+                mode=AnalysisMode.QUICK,
+                provider=ModelProvider.ANTHROPIC
+            )),
+            self._collect_chunks(engine.analyze(
+                content=sample_anr_log,
+                log_type='anr',
+                mode=AnalysisMode.QUICK,
+                provider=ModelProvider.OPENAI
+            ))
+        )
         
         # Both should produce results
         assert len(anthropic_result) > 0
@@ -166,14 +171,14 @@ class TestAiAnalysisEngine:
         assert status['has_error'] is False
     
     @pytest.mark.asyncio
-    async def test_concurrent_analyses(self, engine, sample_anr_log):
+    async def test_concurrent_analyses(self, engine, anr_variants):
         """Test concurrent analysis handling"""
         # Submit multiple analyses
         tasks = []
         
-        for i in range(3):
+        for content in anr_variants:
             task = engine.analyze(
-                content=f"{sample_anr_log}\n// Variant {i}",
+                content=content,
                 log_type='anr',
                 mode=AnalysisMode.QUICK,
                 use_cache=False  # Ensure each runs separately
@@ -217,11 +222,13 @@ class TestAiAnalysisEngine:
     @pytest.mark.asyncio
     async def test_status_monitoring(self, engine, sample_anr_log):
         """Test status monitoring during analysis"""
-        status_updates = []
+        # Only the latest snapshot is needed; the status manager builds a
+        # fresh dict per snapshot, so no defensive copy is required
+        status_updates = collections.deque(maxlen=1)
         
         # Add status listener
         def status_callback(status):
-            status_updates.append(status.copy())
+            status_updates.append(status)
         
         engine.add_status_listener(status_callback)
         
@@ -234,7 +241,7 @@ class TestAiAnalysisEngine:
             pass
         
         # Should have received status updates
-        assert len(status_updates) > 0
+        assert len(status_updates) == 1
         
         # Check status structure
         final_status = engine.get_status()
@@ -319,10 +326,7 @@ class TestEngineCancellation:
         # Create mock that simulates slow streaming
         async def slow_stream():
             for i in range(10):
-                yield Mock(
-                    type='content_block_delta',
-                    delta=Mock(text=f'Chunk {i} ')
-                )
+                yield content_block_delta(f'Chunk {i} ')
                 await asyncio.sleep(0.1)  # Slow streaming
         
         # Patch clients
@@ -435,10 +439,7 @@ class TestEngineResilience:
                 raise Exception("Rate limit exceeded")
             else:
                 # Success after retry
-                yield Mock(
-                    type='content_block_delta',
-                    delta=Mock(text='Success after retry')
-                )
+                yield content_block_delta('Success after retry')
         
         mock_client = AsyncMock()
         mock_client.messages.create = AsyncMock(side_effect=rate_limited_stream)
@@ -464,10 +465,7 @@ class TestEngineResilience:
         # Mock streaming that yields many chunks
         async def large_stream():
             for i in range(100):
-                yield Mock(
-                    type='content_block_delta',
-                    delta=Mock(text=f'Chunk {i} ' * 100)
-                )
+                yield content_block_delta(f'Chunk {i} ' * 100)
         
         mock_client = AsyncMock()
         mock_client.messages.create = AsyncMock(return_value=large_stream())
@@ -3,6 +3,7 @@ Unit tests for analyzers
 """
 import pytest
 import asyncio
+import time
 from unittest.mock import Mock, AsyncMock, patch
 
 from config.base import AnalysisMode
@@ -10,6 +11,7 @@ from analyzers.anr.anthropic import AnthropicApiStreamingANRAnalyzer
 from analyzers.anr.openai import OpenApiStreamingANRAnalyzer
 from analyzers.tombstone.anthropic import AnthropicApiStreamingTombstoneAnalyzer
 from analyzers.tombstone.openai import OpenApiStreamingTombstoneAnalyzer
+from tests.fixtures.stream_events import content_block_delta
 
 class TestAnthropicANRAnalyzer:
     """Test Anthropic ANR analyzer"""
@@ -64,7 +66,7 @@ class TestAnthropicANRAnalyzer:
             yield Mock(type='message_start', usage=Mock(input_tokens=100))
             await asyncio.sleep(0.1)
             cancellation_token.cancel()  # Cancel during streaming
-            yield Mock(type='content_block_delta', delta=Mock(text='Partial'))
+            yield content_block_delta('Partial')
         
         analyzer._client = Mock()
         analyzer._client.messages.create = AsyncMock(return_value=mock_stream())
@@ -250,24 +252,26 @@ class TestAnalyzerComparison:
         anthropic_analyzer._client = mock_anthropic_client
         openai_analyzer._client = mock_openai_client
         
-        # Analyze with both
-        anthropic_result = []
-        async for chunk in anthropic_analyzer.analyze_anr_async(
-            sample_anr_log, 
-            AnalysisMode.QUICK
-        ):
-            anthropic_result.append(chunk)
-        
-        openai_result = []
-        async for chunk in openai_analyzer.analyze_anr_async(
-            sample_anr_log, 
-            AnalysisMode.QUICK
-        ):
-            openai_result.append(chunk)
+        # Analyze with both concurrently (the analyzers share no state)
+        anthropic_result, openai_result = await asyncio.gather(
+            self._collect_chunks(
+                anthropic_analyzer.analyze_anr_async(sample_anr_log, AnalysisMode.QUICK)
+            ),
+            self._collect_chunks(
+                openai_analyzer.analyze_anr_async(sample_anr_log, AnalysisMode.QUICK)
+            )
+        )
         
         # Both should produce non-empty results
         assert len(anthropic_result) > 0
         assert len(openai_result) > 0
+    
+    async def _collect_chunks(self, async_generator):
+        """Helper to collect chunks from async generator"""
+        chunks = []
+        async for chunk in async_generator:
+            chunks.append(chunk)
+        return chunks
 
 
 # Performance tests
@@ -285,10 +289,7 @@ class TestAnalyzerPerformance:
         async def mock_stream():
             yield Mock(type='message_start', usage=Mock(input_tokens=5000))
             for i in range(10):
-                yield Mock(
-                    type='content_block_delta', 
-                    delta=Mock(text=f'Chunk {i} ')
-                )
+                yield content_block_delta(f'Chunk {i} ')
                 await asyncio.sleep(0.01)  # Simulate streaming delay
             yield Mock(type='message_delta', usage=Mock(output_tokens=1000))
         
@@ -296,13 +297,13 @@ class TestAnalyzerPerformance:
         analyzer._client.messages.create = AsyncMock(return_value=mock_stream())
         
         # Measure time
-        start_time = asyncio.get_event_loop().time()
+        start_time = time.perf_counter()
         chunks_received = 0
         
         async for _ in analyzer.analyze_anr_async(large_anr_log, AnalysisMode.QUICK):
             chunks_received += 1
         
-        elapsed_time = asyncio.get_event_loop().time() - start_time
+        elapsed_time = time.perf_counter() - start_time
         
         # Assert
         assert chunks_received == 10
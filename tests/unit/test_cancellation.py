@@ -3,11 +3,21 @@ Unit tests for cancellation mechanism
 """
 import pytest
 import asyncio
+import sys
+import threading
 import time
 from unittest.mock import Mock, AsyncMock, patch
 
 from core.cancellation import CancellationToken, CancellationManager
-from utils.status_manager import EnhancedStatusManager
+
+
+async def run_concurrently(coros):
+    """Run coroutines concurrently and return their results in order"""
+    if sys.version_info >= (3, 11):
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(coro) for coro in coros]
+        return [task.result() for task in tasks]
+    return await asyncio.gather(*coros)
 
 
 class TestCancellationToken:
@@ -41,8 +51,8 @@ class TestCancellationToken:
         token.cancel()
         first_cancelled_at = token.cancelled_at
         
-        # Second cancellation should not change timestamp
-        time.sleep(0.01)
+        # Second cancellation should not change timestamp (monotonic_ns
+        # advances between calls, so no sleep is needed)
         token.cancel()
         
         assert token.cancelled_at == first_cancelled_at
@@ -111,11 +121,24 @@ class TestCancellationToken:
         # Cancel should trigger callback
         token.cancel()
         
-        # Give async callback time to execute
-        await asyncio.sleep(0.01)
+        # Wait for the scheduled async callback to finish
+        await token.wait_callbacks()
         
         assert len(callback_called) == 1
     
+    @pytest.mark.asyncio
+    async def test_wait_cancelled(self):
+        """Test waiting for cancellation without polling"""
+        token = CancellationToken("test-id")
+        
+        future = token.wait_cancelled()
+        assert token.wait_cancelled() is future
+        assert future.done() is False
+        
+        token.cancel()
+        
+        assert await future is True
+    
     def test_multiple_callbacks(self):
         """Test multiple callbacks"""
         token = CancellationToken("test-id")
@@ -153,14 +176,13 @@ class TestCancellationToken:
 class TestCancellationManager:
     """Test cancellation manager functionality"""
     
+    pytestmark = pytest.mark.asyncio
+    
     @pytest.fixture
-    async def manager(self):
-        """Create cancellation manager instance"""
-        manager = CancellationManager()
-        yield manager
-        await manager.cancel_all()
+    def manager(self, cancellation_manager):
+        """Cancellation manager instance (reset between tests)"""
+        return cancellation_manager
     
-    @pytest.mark.asyncio
     async def test_create_token(self, manager):
         """Test token creation"""
         analysis_id = "test-analysis-123"
@@ -175,7 +197,6 @@ class TestCancellationManager:
         retrieved_token = manager.get_token(analysis_id)
         assert retrieved_token is token
     
-    @pytest.mark.asyncio
     async def test_cancel_analysis(self, manager):
         """Test cancelling specific analysis"""
         # Create token
@@ -188,14 +209,12 @@ class TestCancellationManager:
         assert success is True
         assert token.is_cancelled is True
     
-    @pytest.mark.asyncio
     async def test_cancel_nonexistent_analysis(self, manager):
         """Test cancelling non-existent analysis"""
         success = await manager.cancel_analysis("non-existent-id")
         
         assert success is False
     
-    @pytest.mark.asyncio
     async def test_cancel_all(self, manager):
         """Test cancelling all analyses"""
         # Create multiple tokens
@@ -211,20 +230,27 @@ class TestCancellationManager:
         for token in tokens:
             assert token.is_cancelled is True
     
-    @pytest.mark.asyncio
     async def test_cleanup_old_tokens(self, manager):
         """Test cleanup of old tokens"""
-        # Create old tokens
+        # Tokens cancelled more than 1 hour ago
+        real_monotonic_ns = time.monotonic_ns
+        hour_ago = lambda: real_monotonic_ns() - 3700 * 1_000_000_000
         old_tokens = []
-        for i in range(3):
-            token = await manager.create_token(f"old-{i}")
-            token.created_at = time.time() - 3700  # More than 1 hour old
-            old_tokens.append(token)
+        # Only the cancellation module's clock is shifted; the event loop keeps the real one
+        with patch("core.cancellation.time", Mock(wraps=time, monotonic_ns=hour_ago)):
+            for i in range(3):
+                token = await manager.create_token(f"old-{i}")
+                token.cancel()
+                old_tokens.append(token)
+            
+            # Long-running analysis created at the same time, still active
+            running_token = await manager.create_token("running")
         
-        # Create recent tokens
+        # Recently cancelled tokens
         recent_tokens = []
         for i in range(2):
             token = await manager.create_token(f"recent-{i}")
+            token.cancel()
             recent_tokens.append(token)
         
         # Run cleanup
@@ -234,13 +260,23 @@ class TestCancellationManager:
         
         # Old tokens should be removed
         for token in old_tokens:
-            assert manager.get_token(token.analysis_id) is None
+            assert await manager.get_token(token.analysis_id) is None
         
-        # Recent tokens should remain
-        for token in recent_tokens:
-            assert manager.get_token(token.analysis_id) is not None
+        # Recent and running tokens should remain
+        for token in recent_tokens + [running_token]:
+            assert await manager.get_token(token.analysis_id) is token
+        assert await manager.cancel("running") is True
+    
+    async def test_remove_token_prunes_cleanup_heap(self, manager):
+        """Test removed tokens do not accumulate in the cleanup heap"""
+        for i in range(100):
+            token = await manager.create_token(f"done-{i}")
+            token.cancel()
+            await manager.remove_token(token.analysis_id)
+        
+        assert len(manager._cancelled_heap) <= 1
+        assert await manager.cleanup_old_tokens(max_age_seconds=0) == 0
     
-    @pytest.mark.asyncio
     async def test_get_active_analyses(self, manager):
         """Test getting active analyses"""
         # Create some tokens
@@ -250,32 +286,29 @@ class TestCancellationManager:
         cancelled_token.cancel()
         
         # Get active analyses
-        active = await manager.get_active_analyses()
+        active = manager.get_active_analyses()
         
         assert len(active) == 2
         assert "active-1" in active
         assert "active-2" in active
         assert "cancelled-1" not in active
     
-    @pytest.mark.asyncio
     async def test_concurrent_operations(self, manager):
         """Test concurrent token operations"""
         analysis_ids = [f"concurrent-{i}" for i in range(10)]
         
         # Create tokens concurrently
-        create_tasks = [
+        tokens = await run_concurrently(
             manager.create_token(aid) for aid in analysis_ids
-        ]
-        tokens = await asyncio.gather(*create_tasks)
+        )
         
         assert len(tokens) == 10
         
         # Cancel half concurrently
-        cancel_tasks = [
+        results = await run_concurrently(
             manager.cancel_analysis(aid) 
             for aid in analysis_ids[:5]
-        ]
-        results = await asyncio.gather(*cancel_tasks)
+        )
         
         assert all(results)
         
@@ -286,16 +319,61 @@ class TestCancellationManager:
                 assert token.is_cancelled is True
             else:
                 assert token.is_cancelled is False
+    
+    async def test_create_tokens_bulk(self, manager):
+        """Test creating many tokens in one call"""
+        analysis_ids = [f"bulk-{i}" for i in range(10)]
+        
+        tokens = await manager.create_tokens(analysis_ids)
+        
+        assert [token.analysis_id for token in tokens] == analysis_ids
+        for token in tokens:
+            assert await manager.get_token(token.analysis_id) is token
+            assert token.is_cancelled is False
+
+    
+    async def test_tokens_bind_to_creating_loop(self, manager):
+        """Test tokens created on different threads' loops use their own loop"""
+        main_token = await manager.create_token("main-loop")
+        assert main_token.wait_cancelled().get_loop() is asyncio.get_running_loop()
+        
+        results = {}
+        
+        async def worker():
+            token = await manager.create_token("worker-loop")
+            callback_loops = []
+            
+            async def on_cancel():
+                callback_loops.append(asyncio.get_running_loop())
+            
+            token.add_callback(on_cancel)
+            waiter = token.wait_cancelled()
+            token.cancel()
+            await waiter
+            await token.wait_callbacks()
+            results["waiter_loop"] = waiter.get_loop()
+            results["callback_loops"] = callback_loops
+            results["running_loop"] = asyncio.get_running_loop()
+        
+        thread = threading.Thread(target=asyncio.run, args=(worker(),))
+        thread.start()
+        await asyncio.to_thread(thread.join, 5)
+        
+        assert results["waiter_loop"] is results["running_loop"]
+        assert results["callback_loops"] == [results["running_loop"]]
+        assert results["running_loop"] is not asyncio.get_running_loop()
+        assert main_token.is_cancelled is False
+
 
 
 class TestCancellationIntegration:
     """Test cancellation integration with other components"""
     
-    @pytest.mark.asyncio
-    async def test_cancellation_with_status_manager(self):
+    pytestmark = pytest.mark.asyncio
+    
+    async def test_cancellation_with_status_manager(self, status_manager, cancellation_manager):
         """Test cancellation updates status manager"""
-        status_manager = EnhancedStatusManager()
-        manager = CancellationManager()
+        manager = cancellation_manager
         
         # Create and track analysis
         analysis_id = "test-analysis"
@@ -323,7 +401,6 @@ class TestCancellationIntegration:
         assert len(status['feedback']['messages']) > 0
         assert status['feedback']['messages'][-1]['message'] == "Analysis cancelled"
     
-    @pytest.mark.asyncio
     async def test_cancellation_during_streaming(self):
         """Test cancellation during streaming operation"""
         token = CancellationToken("streaming-test")
@@ -352,7 +429,6 @@ class TestCancellationIntegration:
         assert len(chunks_processed) == 3
         assert chunks_processed == ["chunk1", "chunk2", "chunk3"]
     
-    @pytest.mark.asyncio
     async def test_cancellation_with_cleanup(self):
         """Test cancellation with cleanup operations"""
         cleanup_called = []
@@ -361,17 +437,24 @@ class TestCancellationIntegration:
             def __init__(self):
                 self.token = CancellationToken("cleanup-test")
                 self.resources_allocated = True
+                self.started = asyncio.Event()
+            
+            async def _do_work(self):
+                # Simulate long operation
+                self.started.set()
+                await asyncio.sleep(1)
             
             async def analyze(self):
-                try:
-                    # Simulate long operation
-                    for i in range(10):
-                        await self.token.check_cancelled_async()
-                        await asyncio.sleep(0.01)
-                except asyncio.CancelledError:
+                work = asyncio.create_task(self._do_work())
+                done, _ = await asyncio.wait(
+                    [work, self.token.wait_cancelled()],
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if work not in done:
                     # Cleanup on cancellation
+                    work.cancel()
                     await self.cleanup()
-                    raise
+                self.token.check_cancelled()
             
             async def cleanup(self):
                 self.resources_allocated = False
@@ -383,8 +466,8 @@ class TestCancellationIntegration:
         # Start analysis
         analysis_task = asyncio.create_task(analyzer.analyze())
         
-        # Cancel after short delay
-        await asyncio.sleep(0.02)
+        # Cancel once the analysis is under way
+        await analyzer.started.wait()
         analyzer.token.cancel()
         
         # Wait for task to complete
@@ -395,15 +478,16 @@ class TestCancellationIntegration:
         assert len(cleanup_called) == 1
         assert analyzer.resources_allocated is False
     
-    @pytest.mark.asyncio
     async def test_cancellation_propagation(self):
         """Test cancellation propagation through nested operations"""
         token = CancellationToken("propagation-test")
         levels_reached = []
+        level3_reached = asyncio.Event()
         
         async def level_3():
             levels_reached.append(3)
             await token.check_cancelled_async()
+            level3_reached.set()
             await asyncio.sleep(0.1)
             levels_reached.append("3-complete")
         
@@ -423,8 +507,7 @@ class TestCancellationIntegration:
         task = asyncio.create_task(level_1())
         
         # Cancel after reaching level 3
-        while 3 not in levels_reached:
-            await asyncio.sleep(0.01)
+        await level3_reached.wait()
         
         token.cancel()
         
@@ -63,6 +63,27 @@ class TestCostCalculator:
         tokens = calculator.estimate_tokens_from_text(long_text)
         assert 900 <= tokens <= 1100  # Close to word count
     
+    def test_estimate_tokens_from_long_runs(self, calculator):
+        """Test separator-free runs are counted by length, not as one token"""
+        assert calculator.estimate_tokens_from_text("a" * 5000) == 1250
+        assert calculator.estimate_tokens_from_text("deadbeef") == 1
+        
+        # Hex dumps and base64 blobs large enough to be sampled
+        hex_dump = "0123456789abcdef" * 100_000
+        tokens = calculator.estimate_tokens_from_text(hex_dump)
+        assert abs(tokens - len(hex_dump) / 4) <= len(hex_dump) / 4 * 0.1
+        
+        base64_blob = "QUJDREVGR0hJSktMTU5PUFFSU1RVVldYWVo0123456789" * 20_000
+        assert calculator.estimate_tokens_from_text(base64_blob) >= len(base64_blob) // 5
+    
+    def test_estimate_tokens_from_large_text(self, calculator, sample_anr_log):
+        """Test sampled token estimation on large logs"""
+        large_text = sample_anr_log * 200
+        exact = calculator.estimate_tokens_from_text(sample_anr_log) * 200
+        
+        tokens = calculator.estimate_tokens_from_text(large_text)
+        assert abs(tokens - exact) <= exact * 0.1
+    
     def test_estimate_tokens_from_file_size(self, calculator):
         """Test token estimation from file size"""
         # Test small file
@@ -108,6 +129,24 @@ class TestCostCalculator:
         assert cost_estimate['provider'] == "anthropic"
         assert cost_estimate['total_cost'] > 0
     
+    def test_unknown_model_names(self, calculator):
+        """Test unknown or non-string model names raise ValueError"""
+        for model in ("no-such-model", None, 123, ["gpt-4o"]):
+            with pytest.raises(ValueError):
+                calculator.calculate_cost(100, model)
+            with pytest.raises(ValueError):
+                calculator.calculate_single_model_cost(model, 1000, 500)
+            with pytest.raises(ValueError):
+                calculator.format_cost_breakdown(model, 1000, 500)
+        
+        # str subclasses resolve like the plain name
+        class ModelName(str):
+            pass
+        
+        cost = calculator.calculate_single_model_cost(ModelName("gpt-4o"), 1000, 500)
+        assert type(cost['model']) is str
+        assert cost == calculator.calculate_single_model_cost("gpt-4o", 1000, 500)
+    
     def test_calculate_analysis_cost_by_mode(self, calculator):
         """Test cost calculation by analysis mode"""
         # Test quick mode
@@ -155,6 +194,20 @@ class TestCostCalculator:
         # Relative cost of cheapest should be 1.0
         assert comparisons[0]['relative_cost'] == 1.0
     
+    def test_compare_models_relative_cost_small_file(self, calculator):
+        """Test relative costs use unrounded totals for tiny files"""
+        comparisons = calculator.compare_models_cost(file_size_kb=0.5, mode=AnalysisMode.QUICK)
+        
+        totals = {
+            c['model']: calculator.calculate_cost(0.5, c['model'], mode=AnalysisMode.QUICK).total_cost
+            for c in comparisons
+        }
+        cheapest = min(totals.values())
+        assert round(cheapest, 4) == 0  # rounded totals alone would give every model 1.0
+        for comp in comparisons:
+            assert comp['relative_cost'] == round(totals[comp['model']] / cheapest, 2)
+        assert comparisons[-1]['relative_cost'] > 1.0
+    
     def test_get_budget_recommendations(self, calculator):
         """Test budget recommendations"""
         recommendations = calculator.get_budget_recommendations(
@@ -175,6 +228,11 @@ class TestCostCalculator:
         assert 'model' in quick_rec
         assert 'analyses_possible' in quick_rec
         assert 'cost_per_analysis' in quick_rec
+        
+        # An empty file costs nothing, so the budget does not limit it
+        free = calculator.get_budget_recommendations(budget_usd=10.0, file_size_kb=0.0)
+        assert free['recommendations']['quick']['cost_per_analysis'] == 0
+        assert free['recommendations']['quick']['analyses_possible'] is None
     
     def test_estimate_analysis_time(self, calculator):
         """Test analysis time estimation"""
@@ -199,6 +257,35 @@ class TestCostCalculator:
             estimated_tokens=5000
         )
         assert time_est > 0
+        
+        # Explicit zero tokens is honoured, not replaced by the file-size estimate
+        time_est = calculator.estimate_analysis_time(
+            file_size_kb=10_000.0,
+            mode=AnalysisMode.INTELLIGENT,
+            estimated_tokens=0
+        )
+        assert time_est == pytest.approx(200.0)  # 100 min per MB at speed 4, one API call
+        
+        # Tokens beyond one context window add 0.5 min per extra API call
+        time_est = calculator.estimate_analysis_time(
+            file_size_kb=100.0,
+            mode=AnalysisMode.INTELLIGENT,
+            estimated_tokens=500_000
+        )
+        assert time_est == pytest.approx(2.0 + 3 * 0.5)
+    
+    def test_estimate_analysis_time_matches_cost_estimate(self, calculator):
+        """Test the standalone time estimate agrees with calculate_cost"""
+        for model, mode, file_size_kb in [
+            ("gpt-4o", AnalysisMode.QUICK, 100.0),
+            ("gpt-4o-mini", AnalysisMode.QUICK, 1.0),
+            ("claude-3-5-haiku-20241022", AnalysisMode.LARGE_FILE, 2048.0),
+            ("claude-opus-4-20250514", AnalysisMode.MAX_TOKEN, 500.0),
+        ]:
+            estimate = calculator.calculate_cost(file_size_kb, model, mode=mode)
+            assert calculator.estimate_analysis_time(file_size_kb, mode, model=model) == estimate.analysis_time_estimate
+        
+        assert calculator.calculate_cost(100.0, "gpt-4o", mode=AnalysisMode.QUICK).analysis_time_estimate == 2.0
     
     def test_format_cost_breakdown(self, calculator):
         """Test cost breakdown formatting"""
@@ -251,6 +338,54 @@ class TestCostCalculator:
         )
         assert is_valid is True  # Should pass for unknown models
     
+    def test_validate_token_count_large_text(self, calculator):
+        """Test token count validation on million-character text"""
+        # Short text fits by its character count alone
+        text = "tombstone " * 10_000
+        assert calculator.token_upper_bound(text) >= calculator.estimate_tokens_from_text(text)
+        is_valid, _ = calculator.validate_token_count("claude-3-5-haiku-20241022", text=text)
+        assert is_valid is True
+        
+        # ~3 MB Java stack trace is far beyond a 200K context window
+        frame = "\tat com.example.app.MainActivity.onCreate(MainActivity.java:42)\n"
+        large_log = frame * (3_000_000 // len(frame))
+        assert len(large_log) > 1_000_000
+        assert calculator.token_upper_bound(large_log) >= calculator.estimate_tokens_from_text(large_log)
+        
+        is_valid, message = calculator.validate_token_count("claude-3-5-haiku-20241022", text=large_log)
+        assert is_valid is False
+        assert "exceeds" in message.lower()
+        
+        # Whitespace-sparse text over the window is still rejected
+        is_valid, _ = calculator.validate_token_count("gpt-4o", text="x," * 600_000)
+        assert is_valid is False
+        
+        # Separator-free hex and base64 are never accepted on the sampled estimate alone
+        hex_dump = "0123456789abcdef" * 100_000
+        is_valid, _ = calculator.validate_token_count("claude-3-5-haiku-20241022", text=hex_dump)
+        assert is_valid is False
+        base64_blob = "QUJDREVGR0hJSktMTU5PUFFSU1RVVldYWVo0123456789+/" * 22_000
+        assert len(base64_blob) > 1_000_000
+        is_valid, _ = calculator.validate_token_count("gpt-4o", text=base64_blob)
+        assert is_valid is False
+    
+    def test_validate_token_count_cjk_text(self, calculator):
+        """Test the upper bound counts UTF-8 bytes, not characters"""
+        cjk_text = "應用程式無回應" * 6_000
+        assert calculator.token_upper_bound(cjk_text) == 3 * len(cjk_text)
+        assert calculator.token_upper_bound(cjk_text) >= calculator.estimate_tokens_from_text(cjk_text)
+        
+        # Within gpt-4o's window in UTF-8 bytes, so accepted without counting
+        assert calculator.token_upper_bound(cjk_text) < 128_000
+        assert calculator.validate_token_count("gpt-4o", text=cjk_text) == (True, "")
+        
+        # Over the window in bytes but not in characters: decided by the estimate
+        assert calculator.validate_token_count("gpt-4o", text=cjk_text * 2) == (True, "")
+        
+        # Over the window in characters is rejected
+        is_valid, _ = calculator.validate_token_count("gpt-4o", text=cjk_text * 4)
+        assert is_valid is False
+    
     def test_cost_calculation_accuracy(self, calculator):
         """Test cost calculation accuracy"""
         # GPT-4o-mini: $0.15/$0.60 per million
@@ -273,6 +408,49 @@ class TestCostCalculator:
         expected_total = 1.00 + 5.00  # $6.00
         assert abs(cost['total_cost'] - expected_total) < 0.001
     
+    def test_cached_input_cost(self, calculator):
+        """Test prompt-cache reads and writes are priced at their own rates"""
+        # Claude-3-5-sonnet cache reads: 0.10x the $3.00 per million input rate
+        cost = calculator.calculate_single_model_cost(
+            "claude-3-5-sonnet-20241022",
+            input_tokens=0,
+            output_tokens=0,
+            cached_input_tokens=1_000_000
+        )
+        assert cost['cached_input_cost'] == pytest.approx(0.30)
+        assert cost['total_cost'] == pytest.approx(0.30)
+        
+        # Cache writes: 1.25x the input rate
+        cost = calculator.calculate_single_model_cost(
+            "claude-3-5-sonnet-20241022",
+            input_tokens=0,
+            output_tokens=0,
+            cache_write_tokens=1_000_000
+        )
+        assert cost['cache_write_cost'] == pytest.approx(3.75)
+        assert cost['total_cost'] == pytest.approx(3.75)
+        
+        # All buckets add up
+        cost = calculator.calculate_single_model_cost(
+            "claude-3-5-sonnet-20241022",
+            input_tokens=1_000_000,
+            output_tokens=1_000_000,
+            cached_input_tokens=1_000_000,
+            cache_write_tokens=1_000_000
+        )
+        assert cost['total_cost'] == pytest.approx(3.00 + 15.00 + 0.30 + 3.75)
+        
+        # Models without cache pricing bill both buckets at the input rate
+        cost = calculator.calculate_single_model_cost(
+            "gpt-4-turbo",
+            input_tokens=0,
+            output_tokens=0,
+            cached_input_tokens=1_000_000,
+            cache_write_tokens=1_000_000
+        )
+        assert cost['cached_input_cost'] == pytest.approx(10.00)
+        assert cost['cache_write_cost'] == pytest.approx(10.00)
+    
     def test_batch_cost_estimation(self, calculator):
         """Test batch processing cost estimation"""
         # Simulate batch of files
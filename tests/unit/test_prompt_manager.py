@@ -0,0 +1,193 @@
+"""
+Unit tests for PromptManager loading, rendering and export
+"""
+import threading
+
+import pytest
+
+from prompts.manager import PromptManager, dict_loader, disk_loader
+from config.base import AnalysisMode
+
+
+PROMPT_FILES = {
+    "anr_prompts.yaml": {
+        "anr_quick": {
+            "name": "ANR Quick",
+            "description": "Quick ANR analysis",
+            "system_prompt": "You are an Android expert.",
+            "user_prompt": "Analyze {content} in {process|unknown}",
+            "required_variables": ["content"],
+            "tags": ["anr", "quick"]
+        },
+        "anr_default": {
+            "name": "ANR Default",
+            "description": "Default ANR analysis",
+            "user_prompt": "Explain {content}",
+            "required_variables": ["content"],
+            "tags": ["anr"]
+        }
+    }
+}
+
+
+@pytest.fixture
+def manager():
+    """Prompt manager loaded from memory"""
+    manager = PromptManager(loader=dict_loader(PROMPT_FILES))
+    yield manager
+    manager.shutdown()
+
+
+class TestPromptManager:
+    """Test prompt manager functionality"""
+    
+    def test_load_from_memory(self, manager):
+        """Test prompts load from an in-memory loader"""
+        assert set(manager.prompts_cache) == {"anr_quick", "anr_default"}
+        
+        template = manager.prompts_cache["anr_quick"]
+        assert template.name == "ANR Quick"
+        assert template.required_variables == ["content"]
+        assert template.tags == ["anr", "quick"]
+    
+    def test_get_prompt(self, manager):
+        """Test prompt lookup falls back from mode to type default"""
+        assert manager.get_prompt("anr", AnalysisMode.QUICK).name == "ANR Quick"
+        assert manager.get_prompt("anr", AnalysisMode.INTELLIGENT).name == "ANR Default"
+        assert manager.get_prompt("tombstone", AnalysisMode.QUICK) is None
+    
+    def test_disk_loader_round_trip(self, manager, tmp_path):
+        """Test prompts saved to disk load back through the default loader"""
+        manager.save_prompts(str(tmp_path))
+        assert [name for name, _ in disk_loader(tmp_path)] == ["anr_prompts.yaml"]
+        
+        reloaded = PromptManager(prompts_dir=str(tmp_path))
+        assert set(reloaded.prompts_cache) == set(manager.prompts_cache)
+        assert reloaded.render_prompt("anr_quick", content="x") == manager.render_prompt("anr_quick", content="x")
+        
+        # Missing directories load nothing
+        assert list(disk_loader(tmp_path / "missing")) == []
+    
+    def test_prefetch(self, manager):
+        """Test prefetch resolves and precompiles the prompt in the background"""
+        future = manager.prefetch("anr", AnalysisMode.QUICK)
+        assert future.result(timeout=5) is manager.get_prompt("anr", AnalysisMode.QUICK)
+        
+        # Repeated requests share one prefetch
+        assert manager.prefetch("anr", AnalysisMode.QUICK) is future
+        
+        # Falls back to the type default, unknown types return None
+        assert manager.prefetch("anr", AnalysisMode.MAX_TOKEN).result(timeout=5).name == "ANR Default"
+        assert manager.prefetch("unknown", AnalysisMode.QUICK).result(timeout=5) is None
+    
+    def test_prefetch_runs_off_caller_thread(self, manager):
+        """Test prefetch returns before the template is warmed, on another thread"""
+        template = manager.get_prompt("anr", AnalysisMode.QUICK)
+        release = threading.Event()
+        warmed_on = []
+        
+        def blocking_precompile():
+            release.wait(timeout=5)
+            warmed_on.append(threading.current_thread())
+        
+        template.precompile = blocking_precompile
+        
+        future = manager.prefetch("anr", AnalysisMode.QUICK)
+        assert not future.done()
+        
+        release.set()
+        assert future.result(timeout=5) is template
+        assert warmed_on[0] is not threading.current_thread()
+        assert warmed_on[0].name.startswith("prompt-prefetch")
+        
+        # Changing prompts drops the record so the next prefetch runs again
+        manager.add_prompt("anr_intelligent", template.clone())
+        assert manager.prefetch("anr", AnalysisMode.QUICK) is not future
+    
+    def test_render_cache_hit(self, manager):
+        """Test identical renders are served from the cache"""
+        first = manager.render_prompt("anr_quick", content="trace", process="system_server")
+        second = manager.render_prompt("anr_quick", process="system_server", content="trace")
+        
+        assert first == second
+        assert first["user_prompt"] == "Analyze trace in system_server"
+        assert manager._render_cached.cache_info().hits == 1
+        
+        # Callers get their own copy of the cached result
+        first["user_prompt"] = "changed"
+        assert manager.render_prompt("anr_quick", content="trace", process="system_server") == second
+    
+    def test_render_cache_invalidation(self, manager):
+        """Test modifying prompts invalidates cached renders"""
+        assert manager.render_prompt("anr_default", content="x")["user_prompt"] == "Explain x"
+        
+        template = manager.get_prompt("anr", AnalysisMode.MAX_TOKEN).clone()
+        template.user_prompt = "Summarize {content}"
+        manager.update_prompt("anr_default", template)
+        assert manager.render_prompt("anr_default", content="x")["user_prompt"] == "Summarize x"
+        
+        manager.delete_prompt("anr_default")
+        with pytest.raises(KeyError):
+            manager.render_prompt("anr_default", content="x")
+        
+        # The public view cannot be written to behind the cache's back
+        with pytest.raises(TypeError):
+            manager.prompts_cache["anr_default"] = template
+    
+    def test_render_cache_distinguishes_equal_values(self, manager):
+        """Test equal values of different types are not served from each other's cache entry"""
+        assert manager.render_prompt("anr_default", content=1)["user_prompt"] == "Explain 1"
+        assert manager.render_prompt("anr_default", content=True)["user_prompt"] == "Explain True"
+        assert manager.render_prompt("anr_default", content=1.0)["user_prompt"] == "Explain 1.0"
+    
+    def test_render_cache_sees_in_place_changes(self, manager):
+        """Test editing a template returned by get_prompt is picked up by the cache"""
+        assert manager.render_prompt("anr_quick", content="x")["user_prompt"] == "Analyze x in unknown"
+        
+        template = manager.get_prompt("anr", AnalysisMode.QUICK)
+        template.user_prompt = "Inspect {content} in {process}"
+        template.variables["process"] = "system_server"
+        
+        assert manager.render_prompt("anr_quick", content="x")["user_prompt"] == "Inspect x in system_server"
+    
+    def test_render_unhashable_kwargs(self, manager):
+        """Test unhashable variables bypass the cache and render once"""
+        template = manager.get_prompt("anr", AnalysisMode.QUICK)
+        calls = []
+        original_render = template.render
+        
+        def counting_render(**kwargs):
+            calls.append(kwargs)
+            return original_render(**kwargs)
+        
+        template.render = counting_render
+        
+        result = manager.render_prompt("anr_quick", content=["main", "binder"])
+        assert result["user_prompt"] == "Analyze main, binder in unknown"
+        assert len(calls) == 1
+        assert manager._render_cached.cache_info().currsize == 0
+        
+        # Errors raised while rendering are not retried
+        with pytest.raises(ValueError):
+            manager.render_prompt("anr_quick", process=["a"])
+        assert len(calls) == 2
+    
+    def test_export_prompts(self, manager):
+        """Test exporting prompts, including non-plain metadata values"""
+        template = manager.get_prompt("anr", AnalysisMode.QUICK).clone()
+        template.metadata = {"modes": (AnalysisMode.QUICK, AnalysisMode.INTELLIGENT), "owner": "qa"}
+        manager.add_prompt("anr_custom", template)
+        
+        exported = manager.export_prompts(format="yaml")
+        assert "anr_custom:" in exported
+        assert "Analyze {content} in {process|unknown}" in exported
+        
+        # Plain prompts round-trip through the safe importer
+        plain = manager.export_prompts(format="json")
+        other = PromptManager(loader=dict_loader({}))
+        other.import_prompts(plain, format="json")
+        assert other.prompts_cache.keys() == manager.prompts_cache.keys()
+        assert other.prompts_cache["anr_quick"].user_prompt == "Analyze {content} in {process|unknown}"
+        
+        with pytest.raises(ValueError):
+            manager.export_prompts(format="xml")